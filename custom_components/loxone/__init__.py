@@ -7,6 +7,7 @@ https://home-assistant.io/components/loxone/
 import asyncio
 import binascii
 import datetime
+from datetime import timedelta
 import hashlib
 import json
 import logging
@@ -14,22 +15,41 @@ import os
 import time
 import traceback
 import urllib.request as req
-import uuid
 from base64 import b64encode
 from datetime import datetime
-from struct import unpack
+from math import floor
+from struct import calcsize, unpack, unpack_from
 import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 import homeassistant.helpers.config_validation as cv
-import requests
 import voluptuous as vol
 from homeassistant.config import get_default_config_dir
-from homeassistant.const import (CONF_HOST, CONF_PASSWORD, CONF_PORT,
-                                 CONF_USERNAME, EVENT_COMPONENT_LOADED,
+from homeassistant.const import (CONF_HOST, CONF_NAME, CONF_PASSWORD, CONF_PORT,
+                                 CONF_TOKEN, CONF_USERNAME, EVENT_COMPONENT_LOADED,
                                  EVENT_HOMEASSISTANT_START,
                                  EVENT_HOMEASSISTANT_STOP)
+from homeassistant.core import callback
 from homeassistant.helpers.discovery import async_load_platform
-from requests.auth import HTTPBasicAuth
+from homeassistant.helpers.dispatcher import (async_dispatcher_connect,
+                                              async_dispatcher_send)
+from homeassistant.helpers.event import async_track_time_interval
+
+from .archive import ARCHIVE_DIRECTORY, LoxoneArchive
+from .dispatcher import DEFAULT_DISPATCH_BUDGET, PRIORITY_DEFAULT, LoxoneDispatcher
+from .events import DEFAULT_EVENT_INTERVAL, EVENT_STATE, LoxoneStateEvents
+from .history import LoxoneHistory
+from .trace import (DEFAULT_TRACE_BACKUP_COUNT, DEFAULT_TRACE_FILE,
+                    DEFAULT_TRACE_MAX_BYTES, DEFAULT_TRACE_SAMPLE, LoxoneTrace)
+from .watchdog import DEFAULT_WATCHDOG_THRESHOLD, LoxoneWatchdog
+from .multiplexer import (DEFAULT_MULTIPLEXER_HOST, DEFAULT_MULTIPLEXER_PORT,
+                          LoxoneMultiplexer)
+from .stats import STATISTICS_DIRECTORY, LoxoneStatistics
+from .shared_states import SHARED_MEMORY_DIRECTORY, LoxoneSharedStates
+from .state_store import LoxoneStateStore, save_states
 
 REQUIREMENTS = ['websockets', "pycryptodome", "numpy"]
 
@@ -61,9 +81,28 @@ CMD_REFRESH_TOKEN = "jdev/sys/refreshtoken/"
 CMD_ENCRYPT_CMD = "jdev/sys/enc/"
 CMD_ENABLE_UPDATES = "jdev/sps/enablebinstatusupdate"
 CMD_GET_VISUAL_PASSWD = "jdev/sys/getvisusalt/"
+CMD_GET_STRUCTURE_VERSION = "jdev/sps/LoxAPPversion3"
+CMD_GET_STRUCTURE_FILE = "data/LoxAPP3.json"
 
 DEFAULT_TOKEN_PERSIST_NAME = "lox_token.cfg"
 ERROR_VALUE = -1
+
+# Binary value state event: 16 byte uuid (little endian fields) + double
+VALUE_EVENT_DTYPE = np.dtype([('uuid', 'V16'), ('value', '<f8')])
+# Daytimer state: uuid, default value, number of entries, then the entries
+DAYTIMER_HEADER = "<16sdi"
+DAYTIMER_ENTRY_DTYPE = np.dtype([('mode', '<i4'), ('from', '<i4'), ('to', '<i4'),
+                                 ('need_activate', '<i4'), ('value', '<f8')])
+# Weather state: uuid, last update, number of entries, then the entries
+WEATHER_HEADER = "<16sIi"
+WEATHER_ENTRY_DTYPE = np.dtype([('timestamp', '<i4'), ('weather_type', '<i4'),
+                                ('wind_direction', '<i4'), ('solar_radiation', '<i4'),
+                                ('relative_humidity', '<i4'), ('temperature', '<f8'),
+                                ('perceived_temperature', '<f8'), ('dew_point', '<f8'),
+                                ('precipitation', '<f8'), ('wind_speed', '<f8'),
+                                ('barometric_pressure', '<f8')])
+# Loxone timestamps count seconds since 1.1.2009
+LOXONE_EPOCH = 1230768000
 # End of loxone constants
 
 _LOGGER = logging.getLogger(__name__)
@@ -78,46 +117,128 @@ ATTR_UUID = 'uuid'
 ATTR_VALUE = 'value'
 ATTR_CODE = "code"
 ATTR_COMMAND = "command"
+ATTR_MONTH = "month"
 CONF_SCENE_GEN = "generate_scenes"
-
-LOXONE_PLATFORMS = ["sensor", "switch", "cover", "light", "scene", "alarm_control_panel"]
+CONF_HISTORY = "history"
+CONF_HISTORY_UUIDS = "uuids"
+CONF_HISTORY_WINDOW = "window"
+CONF_HISTORY_SIZE = "size"
+DEFAULT_HISTORY_WINDOW = timedelta(minutes=15)
+DEFAULT_HISTORY_SIZE = 1024
+CONF_ARCHIVE = "archive"
+CONF_MULTIPLEXER = "multiplexer"
+CONF_SHARED_MEMORY = "shared_memory"
+CONF_DECODE_THREAD = "decode_in_thread"
+CONF_DISPATCH_BUDGET = "dispatch_budget"
+CONF_TRACE = "trace"
+CONF_TRACE_FILE = "file"
+CONF_TRACE_SAMPLE = "sample"
+CONF_TRACE_UUIDS = "uuids"
+CONF_TRACE_MAX_BYTES = "max_bytes"
+CONF_TRACE_BACKUP_COUNT = "backup_count"
+CONF_WATCHDOG = "watchdog"
+CONF_WATCHDOG_THRESHOLD = "threshold"
+CONF_STATE_EVENTS = "state_events"
+CONF_STATE_EVENTS_UUIDS = "uuids"
+CONF_STATE_EVENTS_INTERVAL = "interval"
+SHARED_STATES_FILE = "loxone_states"
+ARCHIVE_FLUSH_INTERVAL = timedelta(minutes=1)
+STATE_SNAPSHOT_FILE = "loxone_states.npz"
+STATE_SNAPSHOT_INTERVAL = timedelta(minutes=5)
+STRUCTURE_FILE = "loxone_structure.json"
+DATA_MINISERVERS = "miniservers"
+# The unnamed Miniserver keeps the plain event, signal and file names
+DEFAULT_MINISERVER_NAME = ""
+SIGNAL_MOODLIST_CHANGED = "loxone_moodlist_changed"
+SIGNAL_STATES_FRESH = "loxone_states_fresh"
+SIGNAL_STRUCTURE_CHANGED = "loxone_structure_changed"
+
+LOXONE_PLATFORMS = ["sensor", "switch", "cover", "light", "scene", "alarm_control_panel", "weather"]
+
+# (object_id, name) of the groups created for the Loxone entities
+LOXONE_GROUPS = [
+    ("loxone_analog", "Loxone Analog Sensors"),
+    ("loxone_digital", "Loxone Digital Sensors"),
+    ("loxone_switches", "Loxone Switches"),
+    ("loxone_covers", "Loxone Covers"),
+    ("loxone_lights", "Loxone Lights"),
+]
+LOXONE_MAIN_GROUP = ("loxone_group", "Loxone Group")
+# device_typ attribute -> object_id of the group the entity belongs to
+DEVICE_TYP_GROUPS = {
+    "analog_sensor": "loxone_analog",
+    "digital_sensor": "loxone_digital",
+    "switch": "loxone_switches",
+    "jalousie": "loxone_covers",
+    "gate": "loxone_covers",
+    "lightcontrollerv2": "loxone_lights",
+    "dimmer": "loxone_lights",
+    "light": "loxone_lights",
+}
+# Delay to collect several entity additions/removals into one group update
+GROUP_UPDATE_DELAY = 0.5
+# The state dump after enablebinstatusupdate is complete once no frame
+# arrived for this many seconds
+STATE_DUMP_IDLE_TIMEOUT = 0.5
+# Upper bound of the frames ws_listen handles as one batch
+MAX_FRAMES_PER_BATCH = 256
+
+
+def _unique_miniserver_names(miniservers):
+    names = [miniserver[CONF_NAME] for miniserver in miniservers]
+    if len(names) != len(set(names)):
+        raise vol.Invalid("every Miniserver needs a unique name")
+    return miniservers
+
+
+MINISERVER_SCHEMA = vol.Schema({
+    vol.Optional(CONF_NAME, default=DEFAULT_MINISERVER_NAME): vol.Any(cv.slug, DEFAULT_MINISERVER_NAME),
+    vol.Required(CONF_USERNAME): cv.string,
+    vol.Required(CONF_PASSWORD): cv.string,
+    vol.Required(CONF_HOST): cv.string,
+    vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
+    vol.Optional(CONF_SCENE_GEN, default=True): cv.boolean,
+    vol.Optional(CONF_HISTORY, default={}): vol.Schema({
+        vol.Optional(CONF_HISTORY_UUIDS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(CONF_HISTORY_WINDOW, default=DEFAULT_HISTORY_WINDOW): cv.time_period,
+        vol.Optional(CONF_HISTORY_SIZE, default=DEFAULT_HISTORY_SIZE): cv.positive_int,
+    }),
+    vol.Optional(CONF_ARCHIVE, default=False): cv.boolean,
+    vol.Optional(CONF_SHARED_MEMORY, default=False): cv.boolean,
+    vol.Optional(CONF_DECODE_THREAD, default=False): cv.boolean,
+    # milliseconds
+    vol.Optional(CONF_DISPATCH_BUDGET, default=DEFAULT_DISPATCH_BUDGET * 1000): vol.All(
+        vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_TRACE): vol.Schema({
+        vol.Optional(CONF_TRACE_FILE, default=DEFAULT_TRACE_FILE): cv.string,
+        vol.Optional(CONF_TRACE_SAMPLE, default=DEFAULT_TRACE_SAMPLE): cv.positive_int,
+        vol.Optional(CONF_TRACE_UUIDS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(CONF_TRACE_MAX_BYTES, default=DEFAULT_TRACE_MAX_BYTES): cv.positive_int,
+        vol.Optional(CONF_TRACE_BACKUP_COUNT, default=DEFAULT_TRACE_BACKUP_COUNT): cv.positive_int,
+    }),
+    vol.Optional(CONF_WATCHDOG): vol.Schema({
+        # milliseconds
+        vol.Optional(CONF_WATCHDOG_THRESHOLD, default=DEFAULT_WATCHDOG_THRESHOLD * 1000): vol.All(
+            vol.Coerce(float), vol.Range(min=0)),
+    }),
+    vol.Optional(CONF_STATE_EVENTS): vol.Schema({
+        vol.Optional(CONF_STATE_EVENTS_UUIDS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+        # milliseconds, 0 fires the events of every frame right away
+        vol.Optional(CONF_STATE_EVENTS_INTERVAL, default=DEFAULT_EVENT_INTERVAL * 1000): vol.All(
+            vol.Coerce(float), vol.Range(min=0)),
+    }),
+    vol.Optional(CONF_MULTIPLEXER): vol.Schema({
+        vol.Optional(CONF_HOST, default=DEFAULT_MULTIPLEXER_HOST): cv.string,
+        vol.Optional(CONF_PORT, default=DEFAULT_MULTIPLEXER_PORT): cv.port,
+        vol.Required(CONF_TOKEN): cv.string,
+    }),
+})
 
 CONFIG_SCHEMA = vol.Schema({
-    DOMAIN: vol.Schema({
-        vol.Required(CONF_USERNAME): cv.string,
-        vol.Required(CONF_PASSWORD): cv.string,
-        vol.Required(CONF_HOST): cv.string,
-        vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
-        vol.Optional(CONF_SCENE_GEN, default=True): cv.boolean,
-    }),
+    DOMAIN: vol.All(cv.ensure_list, [MINISERVER_SCHEMA], _unique_miniserver_names),
 }, extra=vol.ALLOW_EXTRA)
 
 
-class loxApp(object):
-    def __init__(self):
-        self.host = None
-        self.port = None
-        self.loxapppath = "/data/LoxAPP3.json"
-
-        self.lox_user = None
-        self.lox_pass = None
-        self.json = None
-        self.responsecode = None
-
-    def getJson(self):
-        url = "http://" + str(self.host) + ":" + str(
-            self.port) + self.loxapppath
-        my_response = requests.get(url, auth=HTTPBasicAuth(self.lox_user,
-                                                           self.lox_pass),
-                                   verify=False)
-        if my_response.status_code == 200:
-            self.json = my_response.json()
-        else:
-            self.json = None
-        self.responsecode = my_response.status_code
-        return self.responsecode
-
-
 def get_room_name_from_room_uuid(lox_config, room_uuid):
     if "rooms" in lox_config:
         if room_uuid in lox_config['rooms']:
@@ -133,6 +254,317 @@ def get_cat_name_from_cat_uuid(lox_config, cat_uuid):
     return ""
 
 
+class LoxoneGroups:
+    """Group membership of the Loxone entities, indexed by device type.
+
+    Entities add and remove themselves (see LoxoneEntity), so the groups are
+    built without scanning the state machine. Once the groups exist, changes
+    are collected for GROUP_UPDATE_DELAY seconds and only the affected groups
+    are updated.
+    """
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._members = {object_id: set() for object_id, _ in LOXONE_GROUPS}
+        self._names = dict(LOXONE_GROUPS)
+        self._dirty = set()
+        self._created = False
+        self._update_handle = None
+
+    def add(self, entity_id, device_typ):
+        object_id = DEVICE_TYP_GROUPS.get(device_typ)
+        if object_id is None or entity_id in self._members[object_id]:
+            return
+        self._members[object_id].add(entity_id)
+        self._mark_dirty(object_id)
+
+    def remove(self, entity_id, device_typ):
+        object_id = DEVICE_TYP_GROUPS.get(device_typ)
+        if object_id is None or entity_id not in self._members[object_id]:
+            return
+        self._members[object_id].discard(entity_id)
+        self._mark_dirty(object_id)
+
+    def _mark_dirty(self, object_id):
+        self._dirty.add(object_id)
+        if self._created:
+            self._schedule_update()
+
+    def _schedule_update(self):
+        if self._update_handle is None:
+            self._update_handle = self._hass.loop.call_later(
+                GROUP_UPDATE_DELAY, self._async_schedule_update)
+
+    def _async_schedule_update(self):
+        self._update_handle = None
+        self._hass.async_create_task(self.async_update())
+
+    async def _async_set_group(self, object_id, name, entity_ids, view=False):
+        command = {"object_id": object_id,
+                   "visible": "true",
+                   "view": "true" if view else "false",
+                   "entities": entity_ids,
+                   "name": name}
+        await self._hass.services.async_call("group", "set", command)
+
+    async def async_update(self):
+        """Update the groups whose members changed."""
+        dirty = self._dirty
+        self._dirty = set()
+        await asyncio.gather(*[
+            self._async_set_group(object_id, self._names[object_id],
+                                  sorted(self._members[object_id]))
+            for object_id in dirty])
+
+    async def async_create(self):
+        """Create all Loxone groups concurrently."""
+        self._dirty = set(self._members)
+        try:
+            await self.async_update()
+            await self._async_set_group(
+                LOXONE_MAIN_GROUP[0], LOXONE_MAIN_GROUP[1],
+                ["group.{}".format(object_id) for object_id, _ in LOXONE_GROUPS],
+                view=True)
+        except Exception:
+            _LOGGER.exception("unable to create the Loxone groups")
+        self._created = True
+        if self._dirty:
+            self._schedule_update()
+
+
+def get_miniserver(hass, name):
+    """Return the data of a Miniserver (structure, state store, ...)."""
+    return hass.data[DOMAIN][DATA_MINISERVERS][name]
+
+
+def get_miniserver_name(discovery_info):
+    """Return the name of the Miniserver a platform is set up for."""
+    return (discovery_info or {}).get(CONF_NAME, DEFAULT_MINISERVER_NAME)
+
+
+def get_miniserver_signal(signal, name):
+    """Return the event or dispatcher signal name of a Miniserver."""
+    if name == DEFAULT_MINISERVER_NAME:
+        return signal
+    return "{}_{}".format(signal, name)
+
+
+def get_miniserver_filename(filename, name):
+    """Return the file or directory name used for a Miniserver."""
+    if name == DEFAULT_MINISERVER_NAME:
+        return filename
+    base, extension = os.path.splitext(filename)
+    return "{}_{}{}".format(base, name, extension)
+
+
+def apply_initial_states(hass, miniserver, devices):
+    """Apply the states known so far to new entities before they are added.
+
+    This way every entity is written to the state machine the first time
+    with its real value instead of the default.
+    """
+    initial_states = get_miniserver(hass, miniserver)['state_store'].as_dict()
+    for device in devices:
+        device.update_from_data(initial_states)
+
+
+def async_add_loxone_entities(hass, miniserver, async_add_devices, build_entities):
+    """Add the entities of a platform and keep them in sync with the structure.
+
+    build_entities(loxconfig) returns a dict control uuid -> entity. When the
+    structure file changes, the entities of removed and changed controls are
+    removed and those of new and changed controls are created. The entities
+    of unchanged controls are kept as they are.
+    """
+    def build_miniserver_entities():
+        loxconfig = get_miniserver(hass, miniserver)['loxconfig']
+        built = build_entities(loxconfig)
+        state_uuids = get_state_uuids_by_control(loxconfig)
+        for control_uuid, entity in built.items():
+            entity.miniserver = miniserver
+            entity.loxone_uuids = state_uuids.get(control_uuid)
+        return built
+
+    entities = build_miniserver_entities()
+    apply_initial_states(hass, miniserver, entities.values())
+    async_add_devices(list(entities.values()))
+
+    async def async_structure_changed(changed_uuids):
+        new_entities = build_miniserver_entities()
+        removed = [control_uuid for control_uuid in entities
+                   if control_uuid not in new_entities or control_uuid in changed_uuids]
+        await asyncio.gather(*[entities.pop(control_uuid).async_remove() for control_uuid in removed])
+
+        added = {control_uuid: entity for control_uuid, entity in new_entities.items()
+                 if control_uuid not in entities}
+        entities.update(added)
+        if added:
+            apply_initial_states(hass, miniserver, added.values())
+            async_add_devices(list(added.values()))
+        if removed or added:
+            _LOGGER.debug("structure reload: removed %d, added %d entities", len(removed), len(added))
+
+    async_dispatcher_connect(hass, get_miniserver_signal(SIGNAL_STRUCTURE_CHANGED, miniserver),
+                             async_structure_changed)
+
+
+class LoxoneEntity:
+    """Mixin for Loxone entities, registers the entity with the dispatcher
+    of its Miniserver and in the Loxone groups.
+
+    Entities implement update_from_data, which applies the states of a
+    loxone_event payload and returns True if the entity changed.
+    """
+
+    # Name of the Miniserver, set by async_add_loxone_entities
+    miniserver = DEFAULT_MINISERVER_NAME
+    # State uuids of the control, set by async_add_loxone_entities. None
+    # means the entity gets every update.
+    loxone_uuids = None
+    dispatch_priority = PRIORITY_DEFAULT
+
+    @property
+    def miniserver_data(self):
+        return get_miniserver(self.hass, self.miniserver)
+
+    def update_from_data(self, data):
+        return False
+
+    def _get_device_typ(self):
+        attributes = self.device_state_attributes or self.state_attributes or {}
+        return attributes.get("device_typ")
+
+    @property
+    def assumed_state(self):
+        """Return True while the entity shows values of the saved snapshot."""
+        return self.hass is not None and self.miniserver_data['state_store'].stale
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.miniserver_data['dispatcher'].register(self, self.loxone_uuids)
+        self._loxone_device_typ = self._get_device_typ()
+        self.hass.data[DOMAIN]['groups'].add(self.entity_id, self._loxone_device_typ)
+        self._unsub_states_fresh = None
+        if self.miniserver_data['state_store'].stale:
+            self._unsub_states_fresh = async_dispatcher_connect(
+                self.hass, get_miniserver_signal(SIGNAL_STATES_FRESH, self.miniserver),
+                self.async_schedule_update_ha_state)
+
+    async def async_will_remove_from_hass(self):
+        await super().async_will_remove_from_hass()
+        self.miniserver_data['dispatcher'].unregister(self)
+        self.hass.data[DOMAIN]['groups'].remove(self.entity_id, self._loxone_device_typ)
+        if self._unsub_states_fresh is not None:
+            self._unsub_states_fresh()
+
+
+def get_miniserver_version(lox_config):
+    """Return the Miniserver software version as a tuple of ints."""
+    version = lox_config.get('msInfo', {}).get('swVersion', '')
+    parts = []
+    for part in str(version).split('.'):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+
+def load_structure(filename):
+    """Return the structure file saved by save_structure(), or None."""
+    try:
+        with open(filename) as structure_file:
+            return json.load(structure_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        _LOGGER.warning("ignoring invalid structure file %s", filename)
+        return None
+
+
+def save_structure(filename, lox_config):
+    """Save the structure file. Does blocking I/O."""
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "w") as structure_file:
+        json.dump(lox_config, structure_file)
+    os.replace(temp_filename, filename)
+
+
+def get_changed_controls(old_config, new_config):
+    """Return the uuids of the controls added, removed or changed between
+    two structure files.
+
+    A changed control also changes all of its subcontrols. Renamed rooms and
+    categories change the controls placed in them.
+    """
+    def control_signatures(lox_config):
+        signatures = {}
+        for control in lox_config.get('controls', {}).values():
+            signature = json.dumps([control,
+                                    get_room_name_from_room_uuid(lox_config, control.get('room', '')),
+                                    get_cat_name_from_cat_uuid(lox_config, control.get('cat', ''))],
+                                   sort_keys=True)
+            signatures[control['uuidAction']] = signature
+            for sub_control in control.get('subControls', {}).values():
+                signatures[sub_control['uuidAction']] = signature
+        weather_server = lox_config.get('weatherServer', {})
+        if 'actual' in weather_server.get('states', {}):
+            signatures[weather_server['states']['actual']] = json.dumps(weather_server, sort_keys=True)
+        return signatures
+
+    old_signatures = control_signatures(old_config)
+    new_signatures = control_signatures(new_config)
+    return {control_uuid for control_uuid in set(old_signatures) | set(new_signatures)
+            if old_signatures.get(control_uuid) != new_signatures.get(control_uuid)}
+
+
+def get_state_uuids_by_control(lox_config):
+    """Return a dict control uuid -> uuids of the states of the control.
+
+    The uuids of a control include those of its subcontrols. The weather
+    server counts as a control with the uuid of its actual state.
+    """
+    def control_uuids(control):
+        uuids = {control['uuidAction']}
+        for state in control.get('states', {}).values():
+            if isinstance(state, list):
+                uuids.update(state)
+            else:
+                uuids.add(state)
+        return uuids
+
+    result = {}
+    for control in lox_config.get('controls', {}).values():
+        uuids = control_uuids(control)
+        for sub_control in control.get('subControls', {}).values():
+            sub_uuids = control_uuids(sub_control)
+            result[sub_control['uuidAction']] = sub_uuids
+            uuids |= sub_uuids
+        result[control['uuidAction']] = uuids
+    weather_states = lox_config.get('weatherServer', {}).get('states', {})
+    if 'actual' in weather_states:
+        result[weather_states['actual']] = set(weather_states.values())
+    return result
+
+
+def get_all_state_uuids(json_data):
+    """Return the uuids of all states of all controls and sub controls."""
+    uuids = []
+
+    def add_control(control):
+        uuids.append(control['uuidAction'])
+        for state in control.get('states', {}).values():
+            if isinstance(state, list):
+                uuids.extend(state)
+            else:
+                uuids.append(state)
+        for sub_control in control.get('subControls', {}).values():
+            add_control(sub_control)
+
+    for control in json_data.get('controls', {}).values():
+        add_control(control)
+    return list(dict.fromkeys(uuids))
+
+
 def get_all_push_buttons(json_data):
     return get_all(json_data, ["Pushbutton", "Switch", "TimedSwitch", "Intercom"])
 
@@ -176,181 +608,371 @@ def get_all(json_data, name):
 
 async def async_setup(hass, config):
     """setup loxone"""
-
-    try:
-        lox_config = loxApp()
-        lox_config.lox_user = config[DOMAIN][CONF_USERNAME]
-        lox_config.lox_pass = config[DOMAIN][CONF_PASSWORD]
-        lox_config.host = config[DOMAIN][CONF_HOST]
-        lox_config.port = config[DOMAIN][CONF_PORT]
-        request_code = lox_config.getJson()
-        if request_code == 200 or request_code == "200":
-            hass.data[DOMAIN] = config[DOMAIN]
-            hass.data[DOMAIN]['loxconfig'] = lox_config.json
-            for platform in LOXONE_PLATFORMS:
-                _LOGGER.debug("starting loxone {}...".format(platform))
-                hass.async_create_task(
-                    async_load_platform(hass, platform, DOMAIN, {}, config)
-                )
-            del lox_config
-        else:
-            _LOGGER.error("unable to connect to Loxone")
-    except ConnectionError:
-        _LOGGER.error("unable to connect to Loxone")
+    hass.data[DOMAIN] = {
+        'groups': LoxoneGroups(hass),
+        'light_controllers': {},
+        DATA_MINISERVERS: {},
+        # state/control uuid -> name of the Miniserver it belongs to
+        'routes': {},
+    }
+
+    # The Miniservers connect in parallel, one failing does not stop the others
+    results = await asyncio.gather(*[async_setup_miniserver(hass, config, miniserver_config)
+                                     for miniserver_config in config[DOMAIN]],
+                                   return_exceptions=True)
+    for miniserver_config, result in zip(config[DOMAIN], results):
+        if isinstance(result, Exception):
+            _LOGGER.error("unable to set up Loxone {}".format(miniserver_config[CONF_HOST]),
+                          exc_info=result)
+    results = [result is True for result in results]
+    if not any(results):
         return False
 
-    lox = LoxWs(user=config[DOMAIN][CONF_USERNAME],
-                password=config[DOMAIN][CONF_PASSWORD],
-                host=config[DOMAIN][CONF_HOST],
-                port=config[DOMAIN][CONF_PORT])
+    default_miniserver = config[DOMAIN][0][CONF_NAME]
 
-    async def message_callback(message):
-        hass.bus.async_fire(EVENT, message)
-
-    async def start_loxone(event):
-        await lox.start()
-
-    async def stop_loxone(event):
-        _ = await lox.stop()
-        _LOGGER.debug(_)
+    async def send_command(device_uuid, value, code=None):
+        """Send a command to the Miniserver the uuid belongs to."""
+        name = hass.data[DOMAIN]['routes'].get(device_uuid, default_miniserver)
+        lox = get_miniserver(hass, name).get('lox')
+        if lox is None:
+            _LOGGER.error("Miniserver of {} is not connected".format(device_uuid))
+        elif code is None:
+            await lox.send_websocket_command(device_uuid, value)
+        else:
+            await lox.send_secured__websocket_command(device_uuid, value, code)
 
     async def loxone_discovered(event):
         if "component" in event.data:
             if event.data['component'] == DOMAIN:
-                try:
-                    _LOGGER.info("loxone discovered")
-                    await asyncio.sleep(0.1)
-                    # await asyncio.sleep(0)
-                    entity_ids = hass.states.async_all()
-                    sensors_analog = []
-                    sensors_digital = []
-                    switches = []
-                    covers = []
-                    lights = []
-
-                    for s in entity_ids:
-                        s_dict = s.as_dict()
-                        attr = s_dict['attributes']
-                        if "plattform" in attr and \
-                                attr['plattform'] == DOMAIN:
-                            if attr['device_typ'] == "analog_sensor":
-                                sensors_analog.append(s_dict['entity_id'])
-                            elif attr['device_typ'] == "digital_sensor":
-                                sensors_digital.append(s_dict['entity_id'])
-                            elif attr['device_typ'] == "jalousie" or \
-                                    attr['device_typ'] == "gate":
-                                covers.append(s_dict['entity_id'])
-                            elif attr['device_typ'] == "switch":
-                                switches.append(s_dict['entity_id'])
-                            elif attr['device_typ'] == "lightcontrollerv2":
-                                lights.append(s_dict['entity_id'])
-                            elif attr['device_typ'] == "dimmer":
-                                lights.append(s_dict['entity_id'])
-
-                    sensors_analog.sort()
-                    sensors_digital.sort()
-                    covers.sort()
-                    switches.sort()
-                    lights.sort()
-
-                    async def create_loxone_group(object_id, name,
-                                                  entity_names, visible=True,
-                                                  view=False
-                                                  ):
-                        if visible:
-                            visiblity = "true"
-                        else:
-                            visiblity = "false"
-                        if view:
-                            view_state = "true"
-                        else:
-                            view_state = "false"
-                        command = {"object_id": object_id,
-                                   "visible": visiblity,
-                                   "view": view_state,
-                                   "entities": entity_names,
-                                   "name": name}
-
-                        await hass.services.async_call("group", "set", command)
-
-                    await create_loxone_group("loxone_analog",
-                                              "Loxone Analog Sensors",
-                                              sensors_analog, True, False)
-
-                    await create_loxone_group("loxone_digital",
-                                              "Loxone Digital Sensors",
-                                              sensors_digital, True, False)
-
-                    await create_loxone_group("loxone_switches",
-                                              "Loxone Switches", switches,
-                                              True, False)
-
-                    await create_loxone_group("loxone_covers", "Loxone Covers",
-                                              covers, True, False)
-
-                    await create_loxone_group("loxone_lights", "Loxone Lights",
-                                              lights, True, False)
-
-                    await create_loxone_group("loxone_group", "Loxone Group",
-                                              ["group.loxone_analog",
-                                               "group.loxone_digital",
-                                               "group.loxone_switches",
-                                               "group.loxone_covers",
-                                               "group.loxone_lights",
-                                               "group.loxone_dimmers"
-                                               ],
-                                              True, True)
-                except:
-                    traceback.print_exc()
-
-    res = False
+                unsub_discovered()
+                _LOGGER.info("loxone discovered")
+                await hass.data[DOMAIN]['groups'].async_create()
 
-    try:
-        res = await lox.async_init()
-    except ConnectionError:
-        _LOGGER.error("Connection Error")
+    unsub_discovered = hass.bus.async_listen(EVENT_COMPONENT_LOADED, loxone_discovered)
 
-    if res is True:
-        lox.message_call_back = message_callback
-        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, start_loxone)
-        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop_loxone)
-        hass.bus.async_listen_once(EVENT_COMPONENT_LOADED, loxone_discovered)
+    async def listen_loxone_send(event):
+        """Listen for change Events from Loxone Components"""
+        try:
+            if event.event_type == SENDDOMAIN and isinstance(event.data,
+                                                             dict):
+                value = event.data.get(ATTR_VALUE, DEFAULT)
+                device_uuid = event.data.get(ATTR_UUID, DEFAULT)
+                await send_command(device_uuid, value)
+
+            elif event.event_type == SECUREDSENDDOMAIN and isinstance(event.data,
+                                                                      dict):
+                value = event.data.get(ATTR_VALUE, DEFAULT)
+                device_uuid = event.data.get(ATTR_UUID, DEFAULT)
+                code = event.data.get(ATTR_CODE, DEFAULT)
+                await send_command(device_uuid, value, code)
 
-        async def listen_loxone_send(event):
-            """Listen for change Events from Loxone Components"""
-            try:
-                if event.event_type == SENDDOMAIN and isinstance(event.data,
-                                                                 dict):
-                    value = event.data.get(ATTR_VALUE, DEFAULT)
-                    device_uuid = event.data.get(ATTR_UUID, DEFAULT)
-                    await lox.send_websocket_command(device_uuid, value)
-
-                elif event.event_type == SECUREDSENDDOMAIN and isinstance(event.data,
-                                                                          dict):
-                    value = event.data.get(ATTR_VALUE, DEFAULT)
-                    device_uuid = event.data.get(ATTR_UUID, DEFAULT)
-                    code = event.data.get(ATTR_CODE, DEFAULT)
-                    await lox.send_secured__websocket_command(device_uuid, value, code)
+        except ValueError:
+            traceback.print_exc()
 
-            except ValueError:
-                traceback.print_exc()
+    hass.bus.async_listen(SENDDOMAIN, listen_loxone_send)
+    hass.bus.async_listen(SECUREDSENDDOMAIN, listen_loxone_send)
 
-        hass.bus.async_listen(SENDDOMAIN, listen_loxone_send)
-        hass.bus.async_listen(SECUREDSENDDOMAIN, listen_loxone_send)
+    async def handle_websocket_command(call):
+        """Handle websocket command services."""
+        value = call.data.get(ATTR_VALUE, DEFAULT)
+        device_uuid = call.data.get(ATTR_UUID, DEFAULT)
+        await send_command(device_uuid, value)
 
-        async def handle_websocket_command(call):
-            """Handle websocket command services."""
-            value = call.data.get(ATTR_VALUE, DEFAULT)
-            device_uuid = call.data.get(ATTR_UUID, DEFAULT)
-            await lox.send_websocket_command(device_uuid, value)
+    hass.services.async_register(DOMAIN, 'event_websocket_command',
+                                 handle_websocket_command)
+
+    async def handle_fetch_statistics(call):
+        """Download the Miniserver statistics of a control into the cache."""
+        device_uuid = call.data.get(ATTR_UUID, DEFAULT)
+        month = call.data.get(ATTR_MONTH)
+        name = hass.data[DOMAIN]['routes'].get(device_uuid, default_miniserver)
+        try:
+            entries = await get_miniserver(hass, name)['statistics'].async_get(device_uuid, month)
+            _LOGGER.info("fetched %d statistic entries for %s", len(entries), device_uuid)
+        except (KeyError, ValueError, asyncio.TimeoutError) as err:
+            _LOGGER.error("unable to fetch statistics for %s: %s", device_uuid, err)
+
+    hass.services.async_register(DOMAIN, 'fetch_statistics',
+                                 handle_fetch_statistics)
+
+    def state_events_by_miniserver(call):
+        """Group the uuids of a service call by their Miniserver."""
+        by_miniserver = {}
+        for device_uuid in cv.ensure_list(call.data.get(ATTR_UUID, [])):
+            name = hass.data[DOMAIN]['routes'].get(device_uuid, default_miniserver)
+            state_events = get_miniserver(hass, name).get('state_events')
+            if state_events is None:
+                _LOGGER.error("state events are not enabled for the Miniserver of %s", device_uuid)
+                continue
+            by_miniserver.setdefault(name, (state_events, []))[1].append(device_uuid)
+        return by_miniserver.values()
+
+    async def handle_subscribe_events(call):
+        """Fire loxone_state events for some more uuids."""
+        for state_events, uuids in state_events_by_miniserver(call):
+            state_events.subscribe(uuids)
+
+    async def handle_unsubscribe_events(call):
+        """Stop firing loxone_state events for some uuids."""
+        for state_events, uuids in state_events_by_miniserver(call):
+            state_events.unsubscribe(uuids)
+
+    hass.services.async_register(DOMAIN, 'subscribe_events',
+                                 handle_subscribe_events)
+    hass.services.async_register(DOMAIN, 'unsubscribe_events',
+                                 handle_unsubscribe_events)
+    return True
+
+
+async def async_setup_miniserver(hass, config, miniserver_config):
+    """Connect to one Miniserver and load the platforms for it."""
+    name = miniserver_config[CONF_NAME]
+    state_store = LoxoneStateStore()
+    archive = None
+    if miniserver_config[CONF_ARCHIVE]:
+        archive = LoxoneArchive(hass.config.path(get_miniserver_filename(ARCHIVE_DIRECTORY, name)))
+
+    lox = LoxWs(user=miniserver_config[CONF_USERNAME],
+                password=miniserver_config[CONF_PASSWORD],
+                host=miniserver_config[CONF_HOST],
+                port=miniserver_config[CONF_PORT],
+                token_persist_filename=get_miniserver_filename(DEFAULT_TOKEN_PERSIST_NAME, name),
+                state_store=state_store,
+                archive=archive,
+                decode_in_thread=miniserver_config[CONF_DECODE_THREAD])
+
+    miniserver = dict(miniserver_config)
+    hass.data[DOMAIN][DATA_MINISERVERS][name] = miniserver
+    miniserver['event'] = get_miniserver_signal(EVENT, name)
+    miniserver['state_store'] = state_store
+    miniserver['dispatcher'] = LoxoneDispatcher(miniserver_config[CONF_DISPATCH_BUDGET] / 1000)
+    state_events = None
+    if CONF_STATE_EVENTS in miniserver_config:
+        # loxone_state events for selected uuids replace the loxone_event
+        state_events = LoxoneStateEvents(
+            hass, get_miniserver_signal(EVENT_STATE, name),
+            uuids=miniserver_config[CONF_STATE_EVENTS][CONF_STATE_EVENTS_UUIDS],
+            interval=miniserver_config[CONF_STATE_EVENTS][CONF_STATE_EVENTS_INTERVAL] / 1000)
+    miniserver['state_events'] = state_events
+    if CONF_TRACE in miniserver_config:
+        trace_config = miniserver_config[CONF_TRACE]
+        lox.trace = LoxoneTrace(hass.config.path(get_miniserver_filename(trace_config[CONF_TRACE_FILE], name)),
+                                sample=trace_config[CONF_TRACE_SAMPLE],
+                                uuids=trace_config[CONF_TRACE_UUIDS],
+                                max_bytes=trace_config[CONF_TRACE_MAX_BYTES],
+                                backup_count=trace_config[CONF_TRACE_BACKUP_COUNT])
+        lox.trace.start()
+    if CONF_WATCHDOG in miniserver_config:
+        watchdog = LoxoneWatchdog(miniserver_config[CONF_WATCHDOG][CONF_WATCHDOG_THRESHOLD] / 1000)
+        lox.watchdog = watchdog
+        miniserver['dispatcher'].watchdog = watchdog
+        miniserver['watchdog'] = watchdog
+    history_config = miniserver_config[CONF_HISTORY]
+    miniserver['history'] = LoxoneHistory(
+        history_config[CONF_HISTORY_UUIDS],
+        history_config[CONF_HISTORY_WINDOW].total_seconds(),
+        history_config[CONF_HISTORY_SIZE])
+    miniserver['archive'] = archive
+    multiplexer = None
+    if CONF_MULTIPLEXER in miniserver_config:
+        multiplexer = LoxoneMultiplexer(lox, state_store,
+                                        token=miniserver_config[CONF_MULTIPLEXER][CONF_TOKEN],
+                                        host=miniserver_config[CONF_MULTIPLEXER][CONF_HOST],
+                                        port=miniserver_config[CONF_MULTIPLEXER][CONF_PORT])
+
+    def set_structure(lox_config):
+        miniserver['loxconfig'] = lox_config
+        if lox_config is not None:
+            routes = hass.data[DOMAIN]['routes']
+            routes.update(dict.fromkeys(get_all_state_uuids(lox_config), name))
+
+    # The structure file is downloaded over the websocket by async_init.
+    # The saved copy is only downloaded again if it changed.
+    structure_file = hass.config.path(get_miniserver_filename(STRUCTURE_FILE, name))
+    snapshot_file = hass.config.path(get_miniserver_filename(STATE_SNAPSHOT_FILE, name))
+    statistics_path = hass.config.path(get_miniserver_filename(STATISTICS_DIRECTORY, name))
+    lox.lox_config = await hass.async_add_executor_job(load_structure, structure_file)
+    set_structure(lox.lox_config)
+    shared_states = None
+    if miniserver_config[CONF_SHARED_MEMORY]:
+        shared_directory = SHARED_MEMORY_DIRECTORY
+        if not os.path.isdir(shared_directory):
+            shared_directory = hass.config.path()
+        shared_states = LoxoneSharedStates(
+            os.path.join(shared_directory, get_miniserver_filename(SHARED_STATES_FILE, name)))
+        miniserver['shared_states'] = shared_states
+    shared_states_lock = asyncio.Lock()
+
+    async def resize_shared_states():
+        """Size the shared states file and index for the current slots."""
+        if shared_states_lock.locked():
+            return
+        async with shared_states_lock:
+            uuids = list(state_store.uuids)
+            new_map = await hass.async_add_executor_job(shared_states.resize, uuids)
+            shared_states.activate(new_map, len(uuids))
+            shared_states.write(state_store)
+
+    def fan_out(frame):
+        """Hand the states of one frame to the history, multiplexer and bus."""
+        timestamp, states = frame
+        miniserver['history'].record(states, timestamp)
+        if multiplexer is not None:
+            multiplexer.publish(states)
+        if state_events is not None:
+            state_events.publish(states)
+        else:
+            hass.bus.async_fire(miniserver['event'], states)
+
+    async def message_callback(message, frames=None):
+        """Handle a batch of states.
+
+        message has the latest value of every state, frames the
+        (timestamp, states) of the single frames of the batch. History,
+        multiplexer and events get every frame, so values that changed twice
+        in one batch are not lost; the entities only the latest values.
+        """
+        if frames is None:
+            frames = [(time.time(), message)]
+        if shared_states is not None and not shared_states.write(state_store):
+            # new slots, the file I/O runs in the executor
+            hass.async_create_task(resize_shared_states())
+        await miniserver['dispatcher'].dispatch(message, frames, fan_out)
+
+    async def structure_changed(lox_config):
+        """Apply a new structure file without restarting Home Assistant."""
+        old_config = miniserver['loxconfig']
+        await hass.async_add_executor_job(save_structure, structure_file, lox_config)
+        set_structure(lox_config)
+        miniserver['statistics'] = LoxoneStatistics(hass, lox, lox_config, statistics_path)
+        if shared_states is not None:
+            await resize_shared_states()
+        changed = get_changed_controls(old_config, lox_config)
+        _LOGGER.info("the Loxone structure changed, reloading %d controls", len(changed))
+        async_dispatcher_send(hass, get_miniserver_signal(SIGNAL_STRUCTURE_CHANGED, name), changed)
+
+    async def start_loxone(event=None):
+        if lox.watchdog is not None:
+            lox.watchdog.start()
+        await lox.start()
 
-        hass.services.async_register(DOMAIN, 'event_websocket_command',
-                                     handle_websocket_command)
+    async def flush_archive(now=None):
+        await hass.async_add_executor_job(archive.write, archive.take_pending())
 
+    async def save_state_snapshot(now=None):
+        await hass.async_add_executor_job(save_states, snapshot_file, state_store.export())
+
+    connect_task = None
+
+    async def stop_loxone(event):
+        if connect_task is not None:
+            connect_task.cancel()
+        if lox.watchdog is not None:
+            lox.watchdog.stop()
+        if lox.trace is not None:
+            lox.trace.stop()
+        if multiplexer is not None:
+            await multiplexer.stop()
+        _ = await lox.stop()
+        _LOGGER.debug(_)
+        lox.shutdown_decoder()
+        if archive is not None:
+            await flush_archive()
+        await save_state_snapshot()
+        if shared_states is not None:
+            shared_states.close()
+
+    def load_platforms():
+        for platform in LOXONE_PLATFORMS:
+            _LOGGER.debug("starting loxone {}...".format(platform))
+            hass.async_create_task(
+                async_load_platform(hass, platform, DOMAIN, {CONF_NAME: name}, config)
+            )
+
+    async def async_connect():
+        """Connect and read the state dump, return True on success."""
+        try:
+            res = await lox.async_init()
+        except Exception as err:
+            # OSError, timeouts and the exceptions of the websockets library
+            _LOGGER.error("Connection Error: {}".format(err))
+            res = False
+        if res is not True:
+            _LOGGER.error("unable to connect to Loxone {}".format(miniserver_config[CONF_HOST]))
+            await lox.stop()
+            return False
+        return True
+
+    async def async_connected():
+        """Hook the connection up once async_init succeeded."""
+        miniserver['lox'] = lox
+        if shared_states is not None:
+            await resize_shared_states()
+        if multiplexer is not None:
+            try:
+                await multiplexer.start()
+            except OSError as err:
+                _LOGGER.error("unable to start the multiplexer: {}".format(err))
+        miniserver['statistics'] = LoxoneStatistics(hass, lox, miniserver['loxconfig'], statistics_path)
+        lox.message_call_back = message_callback
+        lox.structure_call_back = structure_changed
+
+    async def connect_and_resync(event):
+        """Connect in the background and replace the values of the snapshot.
+
+        The entities already exist with the snapshot values, so a Miniserver
+        that cannot be reached is retried instead of failing the setup.
+        """
+        snapshot = state_store.snapshot()
+        while not await async_connect():
+            _LOGGER.info("retrying to connect to Loxone {} in {} seconds".format(
+                miniserver_config[CONF_HOST], lox.connect_delay))
+            await asyncio.sleep(lox.connect_delay)
+        await async_connected()
+        # The entities were created from the saved structure file
+        if lox.structure_changed:
+            await structure_changed(lox.lox_config)
+        changed = state_store.changed_states(snapshot, lox.state_dump)
+        _LOGGER.debug("%d states changed since the saved snapshot", len(changed))
+        state_store.stale = False
+        async_dispatcher_send(hass, get_miniserver_signal(SIGNAL_STATES_FRESH, name))
+        if changed:
+            await message_callback(changed)
+        await start_loxone()
+
+    @callback
+    def start_connect_task(event):
+        nonlocal connect_task
+        connect_task = hass.async_create_task(connect_and_resync(event))
+
+    # With a saved snapshot the entities come up right away with their
+    # last known values (flagged as assumed state) and the connection is
+    # made in the background once Home Assistant started.
+    snapshot_loaded = False
+    if lox.lox_config is not None:
+        snapshot_loaded = await hass.async_add_executor_job(state_store.load, snapshot_file)
+
+    if snapshot_loaded:
+        miniserver['statistics'] = LoxoneStatistics(hass, lox, miniserver['loxconfig'], statistics_path)
+        load_platforms()
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, start_connect_task)
     else:
-        res = False
-        _LOGGER.info("Error")
-    return res
+        if not await async_connect():
+            return False
+        if lox.structure_changed:
+            await hass.async_add_executor_job(save_structure, structure_file, lox.lox_config)
+            set_structure(lox.lox_config)
+        await async_connected()
+        # The state dump was read by async_init, so the platforms
+        # create their entities with the current values.
+        load_platforms()
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, start_loxone)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop_loxone)
+    if archive is not None:
+        async_track_time_interval(hass, flush_archive, ARCHIVE_FLUSH_INTERVAL)
+    async_track_time_interval(hass, save_state_snapshot, STATE_SNAPSHOT_INTERVAL)
+    return True
 
 
 # Loxone Stuff
@@ -368,6 +990,96 @@ def time_elapsed_in_seconds():
     return int(round(time.time()))
 
 
+_UUID_STRINGS = {}
+
+
+def uuid_bytes_to_str(uuid_bytes):
+    """Convert a binary Loxone uuid to its string form (cached)."""
+    uuidstr = _UUID_STRINGS.get(uuid_bytes)
+    if uuidstr is None:
+        data1, data2, data3 = unpack('<IHH', uuid_bytes[:8])
+        uuidstr = "{:08x}-{:04x}-{:04x}-{}".format(data1, data2, data3, uuid_bytes[8:].hex())
+        _UUID_STRINGS[uuid_bytes] = uuidstr
+    return uuidstr
+
+
+def decode_value_states(message):
+    """Decode value states (message type 2) into (uuids, values)."""
+    events = np.frombuffer(message, dtype=VALUE_EVENT_DTYPE,
+                           count=len(message) // VALUE_EVENT_DTYPE.itemsize)
+    return [uuid_bytes_to_str(b) for b in events['uuid'].tolist()], events['value']
+
+
+def decode_text_states(message):
+    """Decode text states (message type 3).
+
+    Every state is the uuid, the icon uuid, the text length and the utf-8
+    text padded to a multiple of 4 bytes.
+    """
+    event_dict = {}
+    start = 0
+    while start < len(message):
+        text_length = unpack_from('<I', message, start + 32)[0]
+        text = message[start + 36:start + 36 + text_length]
+        event_dict[uuid_bytes_to_str(message[start:start + 16])] = text.decode("utf-8")
+        start += (floor((4 + text_length + 16 + 16 - 1) / 4) + 1) * 4
+    return event_dict
+
+
+def _decode_entries(message, header_format, entry_dtype, decode_header):
+    """Decode a message of states with a header followed by a list of entries."""
+    event_dict = {}
+    header_size = calcsize(header_format)
+    start = 0
+    while start + header_size <= len(message):
+        uuid_bytes, header_value, nr_entries = unpack_from(header_format, message, start)
+        start += header_size
+        if nr_entries < 0 or start + nr_entries * entry_dtype.itemsize > len(message):
+            _LOGGER.warning("truncated state message: {} entries of {} announced at byte {} of {}".format(
+                nr_entries, uuid_bytes_to_str(uuid_bytes), start, len(message)))
+            break
+        entries = np.frombuffer(message, dtype=entry_dtype, count=nr_entries, offset=start)
+        start += nr_entries * entry_dtype.itemsize
+        names = entry_dtype.names
+        event_dict[uuid_bytes_to_str(uuid_bytes)] = decode_header(
+            header_value, [dict(zip(names, entry)) for entry in entries.tolist()])
+    return event_dict
+
+
+def decode_daytimer_states(message):
+    """Decode daytimer states (message type 4)."""
+    return _decode_entries(message, DAYTIMER_HEADER, DAYTIMER_ENTRY_DTYPE,
+                           lambda default, entries: {"default": default, "entries": entries})
+
+
+def decode_weather_states(message):
+    """Decode weather states (message type 7)."""
+    def decode(last_update, entries):
+        for entry in entries:
+            entry['timestamp'] += LOXONE_EPOCH
+        return {"last_update": last_update + LOXONE_EPOCH, "entries": entries}
+
+    return _decode_entries(message, WEATHER_HEADER, WEATHER_ENTRY_DTYPE, decode)
+
+
+# message type -> decoder of the binary state messages
+STATE_DECODERS = {
+    2: decode_value_states,
+    3: decode_text_states,
+    4: decode_daytimer_states,
+    7: decode_weather_states,
+}
+
+
+def decode_state_frames(frames):
+    """Decode the state messages of a list of (message type, payload).
+
+    Returns the decoded states in the same order, None for other messages.
+    """
+    return [STATE_DECODERS[message_type](message) if message_type in STATE_DECODERS else None
+            for message_type, message in frames]
+
+
 class LxJsonKeySalt:
     def __init__(self):
         self.key = None
@@ -412,7 +1124,8 @@ class LoxWs:
     def __init__(self, user=None,
                  password=None,
                  host="http://192.168.1.225 ",
-                 port="8080", token_persist_filename=None):
+                 port="8080", token_persist_filename=None, state_store=None,
+                 archive=None, decode_in_thread=False):
         self._username = user
         self._pasword = password
         self._host = host
@@ -440,12 +1153,25 @@ class LoxWs:
         self._keep_alive_task = None
 
         self.message_call_back = None
+        self.structure_call_back = None
         self._pending = []
+        self._file_requests = deque()
+        self._drain_unsupported = False
+        self.state_dump = {}
+        self.lox_config = None
+        self.structure_changed = False
 
         self.connect_retries = 10
         self.connect_delay = 30
         self.state = "CLOSED"
         self._secured_queue = queue.Queue(maxsize=1)
+        self.state_store = state_store
+        self.archive = archive
+        self._decode_executor = None
+        self.watchdog = None
+        self.trace = None
+        if decode_in_thread:
+            self._decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="loxone_decoder")
 
     @property
     def key(self):
@@ -529,7 +1255,23 @@ class LoxWs:
                     break
 
     async def reconnect(self):
-        return await self.async_init()
+        snapshot = None
+        if self.state_store is not None:
+            snapshot = self.state_store.snapshot()
+        res = await self.async_init()
+        # A new program makes the Miniserver restart, so a changed structure
+        # is noticed here
+        if res is True and self.structure_changed and self.structure_call_back is not None:
+            await self.structure_call_back(self.lox_config)
+        if res is True and self.message_call_back is not None and self.state_dump:
+            changed = self.state_dump
+            if snapshot is not None:
+                changed = self.state_store.changed_states(snapshot, self.state_dump)
+                _LOGGER.info("resync after reconnect: %d of %d states changed, %d suppressed",
+                             len(changed), len(self.state_dump), len(self.state_dump) - len(changed))
+            if changed:
+                await self.message_call_back(changed)
+        return res
 
     async def stop(self):
         try:
@@ -565,9 +1307,25 @@ class LoxWs:
     async def send_websocket_command(self, device_uuid, value):
         """Send a websocket command to the Miniserver."""
         command = "jdev/sps/io/{}/{}".format(device_uuid, value)
-        _LOGGER.debug("send command: {}".format(command))
+        if self.trace is not None:
+            self.trace.command(command)
         await self._ws.send(command)
 
+    async def get_file(self, name, timeout=TIMEOUT):
+        """Request a file from the Miniserver and return its content.
+
+        The content arrives as a binary file message in ws_listen, which
+        hands it to the oldest pending request.
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._file_requests.append(future)
+        try:
+            await self._ws.send(name)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if future in self._file_requests:
+                self._file_requests.remove(future)
+
     async def async_init(self):
         import websockets as wslib
         _LOGGER.debug("try to read token")
@@ -577,27 +1335,27 @@ class LoxWs:
         except IOError:
             _LOGGER.debug("error token read")
 
-        # Get public key from Loxone
-        resp = self.get_public_key()
-
-        if not resp:
-            return ERROR_VALUE
-
-        # Init resa cipher
-        rsa_gen = self.init_rsa_cipher()
-        if not rsa_gen:
-            return ERROR_VALUE
-
-        # Generate session key
-        session_gen = self.generate_session_key()
-        if not session_gen:
-            return ERROR_VALUE
-
-        # Exchange keys
         try:
             self._ws = await wslib.connect(
                 "ws://{}:{}/ws/rfc6455".format(self._host, self._port),
                 timeout=TIMEOUT)
+
+            # Get public key from Loxone
+            resp = await self.get_public_key()
+            if not resp:
+                return ERROR_VALUE
+
+            # Init resa cipher
+            rsa_gen = self.init_rsa_cipher()
+            if not rsa_gen:
+                return ERROR_VALUE
+
+            # Generate session key
+            session_gen = self.generate_session_key()
+            if not session_gen:
+                return ERROR_VALUE
+
+            # Exchange keys
             await self._ws.send(
                 "{}{}".format(CMD_KEY_EXCHANGE, self._session_key))
 
@@ -631,130 +1389,263 @@ class LoxWs:
         if res is ERROR_VALUE:
             return ERROR_VALUE
 
+        if not await self.get_structure():
+            return ERROR_VALUE
+
         command = "{}".format(CMD_ENABLE_UPDATES)
         enc_command = await self.encrypt(command)
         await self._ws.send(enc_command)
-        _ = await self._ws.recv()
-        _ = await self._ws.recv()
+        self.state_dump = await self._async_read_state_dump()
 
         self.state = "CONNECTED"
         return True
 
+    async def _async_recv_response(self):
+        """Return the payload of the next response, skipping its header(s).
+
+        Only used before ws_listen runs. Large responses are announced by an
+        estimated header followed by the exact one.
+        """
+        message = await asyncio.wait_for(self._ws.recv(), TIMEOUT)
+        while len(message) == 8:
+            await self.parse_loxone_message(message)
+            message = await asyncio.wait_for(self._ws.recv(), TIMEOUT)
+        return message
+
+    async def get_structure(self):
+        """Download the structure file unless the known one is up to date.
+
+        The file is requested as a file message on the authenticated
+        websocket. Sets structure_changed if a new file was downloaded.
+        """
+        self.structure_changed = False
+        try:
+            enc_command = await self.encrypt(CMD_GET_STRUCTURE_VERSION)
+            await self._ws.send(enc_command)
+            resp_json = json.loads(await self._async_recv_response())
+            last_modified = resp_json['LL']['value']
+            if self.lox_config is not None and self.lox_config.get('lastModified') == last_modified:
+                _LOGGER.debug("structure file is up to date ({})".format(last_modified))
+                return True
+
+            await self._ws.send(CMD_GET_STRUCTURE_FILE)
+            self.lox_config = json.loads(await self._async_recv_response())
+        except (asyncio.TimeoutError, KeyError, TypeError, ValueError) as err:
+            _LOGGER.error("unable to get the structure file: {}".format(err))
+            return False
+
+        _LOGGER.debug("structure file downloaded ({})".format(self.lox_config.get('lastModified')))
+        self.structure_changed = True
+        if self.state_store is not None:
+            self.state_store.slots(get_all_state_uuids(self.lox_config))
+        return True
+
+    async def _async_read_state_dump(self):
+        """Read the response to enablebinstatusupdate and the state dump.
+
+        Right after enabling the updates the Miniserver sends the value of
+        every state. The frames are decoded here (which also fills the state
+        store) and returned as one dict instead of being dispatched one by
+        one. The dump ends when no frame arrived for STATE_DUMP_IDLE_TIMEOUT
+        seconds, or after TIMEOUT seconds in total, as states that change
+        often never let the connection go quiet. Later frames are left to
+        ws_listen.
+        """
+        state_dump = {}
+        timeout = TIMEOUT
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _LOGGER.debug("state dump not finished after %d seconds", TIMEOUT)
+                break
+            try:
+                message = await asyncio.wait_for(self._ws.recv(), min(timeout, remaining))
+            except asyncio.TimeoutError:
+                break
+            if len(message) == 8:
+                await self.parse_loxone_message(message)
+                continue
+            parsed_data = await self._parse_loxone_message(message)
+            if self._current_message_typ in (2, 3, 4, 7):
+                state_dump.update(parsed_data)
+                timeout = STATE_DUMP_IDLE_TIMEOUT
+            self._current_message_typ = None
+        _LOGGER.debug("state dump with %d states received", len(state_dump))
+        return state_dump
+
     async def get_visual_hash(self):
         command = "{}{}".format(CMD_GET_VISUAL_PASSWD, self._username)
         enc_command = await self.encrypt(command)
         await self._ws.send(enc_command)
 
     async def ws_listen(self):
-        """Listen to all commands from the Miniserver."""
+        """Listen to all commands from the Miniserver.
+
+        All frames already received are handled in one go. message_call_back
+        gets the latest value of every state in the batch, and the
+        (timestamp, states) of the single frames for consumers that need
+        every value.
+        """
+        from websockets.exceptions import ConnectionClosed
         try:
             while True:
-                message = await self._ws.recv()
-                await self._async_process_message(message)
+                frames = list(self._pair_frames(await self._async_recv_frames()))
+                decoded = await self._decode_frames(frames)
+                states = {}
+                frame_states = []
+                for (message_type, timestamp, message), decoded_states in zip(frames, decoded):
+                    self._current_message_typ = message_type
+                    parsed_data = await self._async_process_message(message, decoded_states, timestamp)
+                    if isinstance(parsed_data, dict) and parsed_data:
+                        states.update(parsed_data)
+                        frame_states.append((timestamp, parsed_data))
+                if states and self.message_call_back is not None:
+                    await self.message_call_back(states, frame_states)
                 await asyncio.sleep(0)
-        except:
+        except ConnectionClosed as err:
+            _LOGGER.debug("websocket closed: {}".format(err))
+        except asyncio.CancelledError:
             pass
+        except Exception:
+            _LOGGER.exception("error processing Loxone messages, reconnecting")
+
+    async def _async_recv_frames(self):
+        """Wait for the next frame and return it with the ones buffered behind it.
+
+        recv() returns without suspending while the websocket has received
+        messages queued, so the queue is drained up to MAX_FRAMES_PER_BATCH.
+        Returns (receive time, frame) tuples.
+        """
+        frames = [(time.time(), await self._ws.recv())]
+        buffered = getattr(self._ws, "messages", None)
+        if buffered is None and not self._drain_unsupported:
+            # only the websockets protocol implementation with a messages
+            # deque is supported, otherwise every frame is its own batch
+            self._drain_unsupported = True
+            _LOGGER.warning("this websockets version does not expose its received messages, "
+                            "frames are processed one at a time")
+        while buffered and len(frames) < MAX_FRAMES_PER_BATCH:
+            frames.append((time.time(), await self._ws.recv()))
+        return frames
+
+    def _pair_frames(self, frames):
+        """Yield (message type, receive time, payload) of the payload frames.
+
+        The header of a payload can be the last frame of the previous batch,
+        so the message type is kept in _current_message_typ across calls
+        until its payload arrived.
+        """
+        for timestamp, frame in frames:
+            if len(frame) == 8:
+                unpacked_data = unpack('ccccI', frame)
+                self._current_message_typ = int.from_bytes(unpacked_data[1],
+                                                           byteorder='big')
+                if self._current_message_typ == 5:
+                    _LOGGER.info("Miniserver goes out of service, e.g. to load a new program")
+                if self._current_message_typ == 6:
+                    _LOGGER.debug("Keep alive response received...")
+            else:
+                yield self._current_message_typ, timestamp, frame
+                self._current_message_typ = None
+
+    async def _decode_frames(self, frames):
+        """Decode the state messages of a batch in one call of the decoder thread.
+
+        Returns the decoded states in the order of frames, None for other
+        messages. Without the decoder thread all are None and the messages are
+        decoded by _parse_loxone_message.
+        """
+        if self._decode_executor is None:
+            return [None] * len(frames)
+        return await asyncio.get_event_loop().run_in_executor(
+            self._decode_executor, decode_state_frames,
+            [(message_type, message) for message_type, _, message in frames])
+
+    async def _async_process_message(self, message, decoded_states=None, timestamp=None):
+        """Process a payload frame received at timestamp and return the parsed data."""
+        started = time.perf_counter()
+        parsed_data = await self._parse_loxone_message(message, decoded_states, timestamp)
+        if self.trace is not None:
+            self.trace.frame(self._current_message_typ, parsed_data)
 
-    async def _async_process_message(self, message):
-        """Process the messages."""
-        if len(message) == 8:
-            unpacked_data = unpack('ccccI', message)
-            self._current_message_typ = int.from_bytes(unpacked_data[1],
-                                                       byteorder='big')
-            if self._current_message_typ == 6:
-                _LOGGER.debug("Keep alive response received...")
-        else:
-            parsed_data = await self._parse_loxone_message(message)
-            _LOGGER.debug("message [type:{}]):{}".format(self._current_message_typ, parsed_data))
-
-            try:
-                resp_json = json.loads(parsed_data)
-            except TypeError:
-                resp_json = None
-
-            # Visual hash and key response
-            if resp_json is not None and 'LL' in resp_json:
-                if "control" in resp_json['LL'] and "code" in resp_json['LL'] and resp_json['LL']['code'] in [200, '200']:
-                    if 'value' in resp_json['LL']:
-                        if 'key' in resp_json['LL']['value'] and 'salt' in resp_json['LL']['value']:
-                            key_and_salt = LxJsonKeySalt()
-                            key_and_salt.key = resp_json['LL']['value']['key']
-                            key_and_salt.salt = resp_json['LL']['value']['salt']
-                            key_and_salt.time_elapsed_in_seconds = time_elapsed_in_seconds()
-                            self._visual_hash = key_and_salt
-
-                            while not self._secured_queue.empty():
-                                secured_message = self._secured_queue.get()
-                                await self.send_secured(secured_message[0], secured_message[1], secured_message[2])
-
-            if self.message_call_back is not None:
-                if "LL" not in parsed_data and parsed_data != {}:
-                    await self.message_call_back(parsed_data)
-            self._current_message_typ = None
-            await asyncio.sleep(0)
-
-    async def _parse_loxone_message(self, message):
-        """Parser of the Loxone message."""
+        try:
+            resp_json = json.loads(parsed_data)
+        except TypeError:
+            resp_json = None
+
+        # Visual hash and key response
+        if resp_json is not None and 'LL' in resp_json:
+            if "control" in resp_json['LL'] and "code" in resp_json['LL'] and resp_json['LL']['code'] in [200, '200']:
+                if 'value' in resp_json['LL']:
+                    if 'key' in resp_json['LL']['value'] and 'salt' in resp_json['LL']['value']:
+                        key_and_salt = LxJsonKeySalt()
+                        key_and_salt.key = resp_json['LL']['value']['key']
+                        key_and_salt.salt = resp_json['LL']['value']['salt']
+                        key_and_salt.time_elapsed_in_seconds = time_elapsed_in_seconds()
+                        self._visual_hash = key_and_salt
+
+                        while not self._secured_queue.empty():
+                            secured_message = self._secured_queue.get()
+                            await self.send_secured(secured_message[0], secured_message[1], secured_message[2])
+
+        if self.watchdog is not None:
+            self.watchdog.frame(self._current_message_typ,
+                                len(parsed_data) if isinstance(parsed_data, dict) else 1,
+                                time.perf_counter() - started)
+        return parsed_data
+
+    async def _decode_states(self, message_type, message):
+        """Run the decoder of a state message, in the decoder thread if enabled.
+
+        Only the decoding runs in the thread; the results are applied to the
+        state store and archive on the event loop.
+        """
+        decoder = STATE_DECODERS[message_type]
+        if self._decode_executor is None:
+            return decoder(message)
+        return await asyncio.get_event_loop().run_in_executor(self._decode_executor, decoder, message)
+
+    def shutdown_decoder(self):
+        """Stop the decoder thread. Not part of stop(), which reconnects also call."""
+        if self._decode_executor is not None:
+            self._decode_executor.shutdown(wait=False)
+            self._decode_executor = None
+
+    async def _parse_loxone_message(self, message, decoded_states=None, timestamp=None):
+        """Parser of the Loxone message.
+
+        decoded_states is the result of the state decoder if the message was
+        already decoded in the decoder thread, timestamp the receive time for
+        the archive (now if None).
+        """
         event_dict = {}
         if self._current_message_typ == 0:
             event_dict = message
         elif self._current_message_typ == 1:
-            pass
+            while self._file_requests:
+                future = self._file_requests.popleft()
+                if not future.done():
+                    future.set_result(message)
+                    break
         elif self._current_message_typ == 2:
-            length = len(message)
-            num = length / 24
-            start = 0
-            end = 24
-            for i in range(int(num)):
-                packet = message[start:end]
-                event_uuid = uuid.UUID(bytes_le=packet[0:16])
-                fields = event_uuid.urn.replace("urn:uuid:", "").split("-")
-                uuidstr = "{}-{}-{}-{}{}".format(
-                    fields[0], fields[1], fields[2], fields[3], fields[4])
-                value = unpack('d', packet[16:24])[0]
-                event_dict[uuidstr] = value
-                start += 24
-                end += 24
-        elif self._current_message_typ == 3:
-            from math import floor
-            start = 0
-
-            def get_text(message, start, offset):
-                first = start
-                second = start + offset
-                event_uuid = uuid.UUID(bytes_le=message[first:second])
-                first += offset
-                second += offset
-
-                icon_uuid_fields = event_uuid.urn.replace("urn:uuid:", "").split("-")
-                uuidstr = "{}-{}-{}-{}{}".format(
-                    icon_uuid_fields[0], icon_uuid_fields[1], icon_uuid_fields[2], icon_uuid_fields[3],
-                    icon_uuid_fields[4])
-
-                icon_uuid = uuid.UUID(bytes_le=message[first:second])
-                icon_uuid_fields = icon_uuid.urn.replace("urn:uuid:", "").split("-")
-                uuidiconstr = "{}-{}-{}-{}{}".format(icon_uuid_fields[0], icon_uuid_fields[1], icon_uuid_fields[2],
-                                                     icon_uuid_fields[3], icon_uuid_fields[4])
-
-                first = second
-                second += 4
-
-                text_length = unpack('<I', message[first:second])[0]
-
-                first = second
-                second = first + text_length
-                message_str = unpack('{}s'.format(text_length), message[first:second])[0]
-                start += (floor((4 + text_length + 16 + 16 - 1) / 4) + 1) * 4
-                event_dict[uuidstr] = message_str.decode("utf-8")
-                return start
-
-            while start < len(message):
-                start = get_text(message, start, 16)
+            if decoded_states is None:
+                decoded_states = await self._decode_states(2, message)
+            uuids, values = decoded_states
+            if self.state_store is not None:
+                self.state_store.update_values(uuids, values)
+            if self.archive is not None:
+                self.archive.append(uuids, values, timestamp)
+            event_dict = dict(zip(uuids, values.tolist()))
+        elif self._current_message_typ in STATE_DECODERS:
+            event_dict = decoded_states
+            if event_dict is None:
+                event_dict = await self._decode_states(self._current_message_typ, message)
+            if self.state_store is not None:
+                self.state_store.update_texts(event_dict)
 
         elif self._current_message_typ == 6:
             event_dict["keep_alive"] = "received"
-        else:
-            self._current_message_typ = 7
         return event_dict
 
     async def use_token(self):
@@ -983,29 +1874,18 @@ class LoxWs:
             _LOGGER.debug("{}".format(traceback.print_exc()))
             return False
 
-    def get_public_key(self):
-        command = "http://{}:{}/{}".format(self._host, self._port,
-                                           CMD_GET_PUBLIC_KEY)
-        _LOGGER.debug("try to get public key: {}".format(command))
-
-        try:
-            response = requests.get(command, auth=(self._username, self._pasword), timeout=1)
-        except:
-            return False
-
-        if response.status_code != 200:
-            _LOGGER.debug(
-                "error get_public_key: {}".format(response.status_code))
-            return False
+    async def get_public_key(self):
+        _LOGGER.debug("try to get public key")
+        await self._ws.send(CMD_GET_PUBLIC_KEY)
         try:
-            resp_json = json.loads(response.text)
+            resp_json = json.loads(await self._async_recv_response())
             if 'LL' in resp_json and 'value' in resp_json['LL']:
                 self._public_key = resp_json['LL']['value']
                 _LOGGER.debug("get_public_key successfully...")
             else:
                 _LOGGER.debug("public key load error")
                 return False
-        except ValueError:
+        except (asyncio.TimeoutError, ValueError):
             _LOGGER.debug("public key load error")
             return False
         return True
@@ -22,7 +22,9 @@ from homeassistant.const import (
 
 import homeassistant.helpers.config_validation as cv
 
-from . import get_all_alarm, get_room_name_from_room_uuid, get_cat_name_from_cat_uuid
+from . import get_all_alarm, get_room_name_from_room_uuid, get_cat_name_from_cat_uuid, LoxoneEntity, \
+    async_add_loxone_entities, get_miniserver_name
+from .dispatcher import PRIORITY_SECURITY
 
 CONF_UUID = "uuid"
 EVENT = "loxone_event"
@@ -50,27 +52,28 @@ async def async_setup_platform(hass, config, async_add_devices, discovery_info=N
     if discovery_info is None:
         return
 
-    config = hass.data[DOMAIN]
-    loxconfig = config['loxconfig']
-    devices = []
-
-    for loxone_alarm in get_all_alarm(loxconfig):
-        new_alarm = LoxoneAlarm(name=loxone_alarm['name'],
-                                uuid=loxone_alarm['uuidAction'],
-                                sensortyp="alarm",
-                                room=get_room_name_from_room_uuid(loxconfig,
-                                                                  loxone_alarm.get('room', '')),
-                                cat=get_cat_name_from_cat_uuid(loxconfig,
-                                                               loxone_alarm.get('cat', '')),
-                                complete_data=loxone_alarm, code="None")
-
-        hass.bus.async_listen(EVENT, new_alarm.event_handler)
-        devices.append(new_alarm)
-    async_add_devices(devices)
+    def build_entities(loxconfig):
+        devices = {}
+
+        for loxone_alarm in get_all_alarm(loxconfig):
+            new_alarm = LoxoneAlarm(name=loxone_alarm['name'],
+                                    uuid=loxone_alarm['uuidAction'],
+                                    sensortyp="alarm",
+                                    room=get_room_name_from_room_uuid(loxconfig,
+                                                                      loxone_alarm.get('room', '')),
+                                    cat=get_cat_name_from_cat_uuid(loxconfig,
+                                                                   loxone_alarm.get('cat', '')),
+                                    complete_data=loxone_alarm, code="None")
+
+            devices[loxone_alarm['uuidAction']] = new_alarm
+        return devices
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
     return True
 
 
-class LoxoneAlarm(alarm.AlarmControlPanel):
+class LoxoneAlarm(LoxoneEntity, alarm.AlarmControlPanel):
+    dispatch_priority = PRIORITY_SECURITY
 
     def __init__(self, name, uuid, sensortyp, room="", cat="",
                  complete_data=None, code=None):
@@ -117,22 +120,21 @@ class LoxoneAlarm(alarm.AlarmControlPanel):
             self._code = None
         return self._secured
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         request_update = False
-        if self._armed_uuid in event.data:
-            self._state = event.data[self._armed_uuid]
+        if self._armed_uuid in data:
+            self._state = data[self._armed_uuid]
             request_update = True
 
-        if self._armed_delay_uuid in event.data:
-            self._armed_delay = event.data[self._armed_delay_uuid]
+        if self._armed_delay_uuid in data:
+            self._armed_delay = data[self._armed_delay_uuid]
             request_update = True
 
-        if self._armed_delay_total_delay_uuid in event.data:
-            self._armed_delay_total_delay = event.data[self._armed_delay_total_delay_uuid]
+        if self._armed_delay_total_delay_uuid in data:
+            self._armed_delay_total_delay = data[self._armed_delay_total_delay_uuid]
             request_update = True
 
-        if request_update:
-            self.async_schedule_update_ha_state()
+        return request_update
 
     @property
     def armed_delay(self):
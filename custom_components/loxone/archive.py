@@ -0,0 +1,159 @@
+"""
+Compact on-disk archive of Miniserver value state changes.
+
+One file per UTC day holds a sequence of independent blocks. Each block
+stores its rows column by column:
+
+- the uuids used in the block (newline separated),
+- timestamps in milliseconds, delta encoded,
+- the index of each row's uuid in the block's uuid list,
+- the IEEE 754 bits of each value, XORed with the previous value of the
+  same uuid in the block (slowly changing states become mostly zero bits),
+
+and every column is zlib compressed.
+"""
+import datetime
+import logging
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+ARCHIVE_DIRECTORY = "loxone_archive"
+ARCHIVE_SUFFIX = ".lxa"
+BLOCK_MAGIC = b"LXA1"
+# magic, rows, first timestamp [ms], uuid/timestamp/index/value column sizes
+BLOCK_HEADER = struct.Struct("<4sIqIIII")
+
+
+def _xor_encode(indexes, bits):
+    """XOR every value with the previous value of the same uuid."""
+    order = np.argsort(indexes, kind='stable')
+    sorted_indexes = indexes[order]
+    sorted_bits = bits[order]
+    encoded = sorted_bits.copy()
+    same = sorted_indexes[1:] == sorted_indexes[:-1]
+    encoded[1:][same] ^= sorted_bits[:-1][same]
+    result = np.empty_like(bits)
+    result[order] = encoded
+    return result
+
+
+def _archive_day(timestamp):
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d")
+
+
+def encode_block(timestamps, uuids, values):
+    """Encode rows (timestamps in ms, uuid strings, float values) as a block."""
+    block_uuids, indexes = np.unique(np.asarray(uuids), return_inverse=True)
+    indexes = indexes.astype(np.uint32)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    deltas = np.diff(timestamps, prepend=timestamps[0])
+    bits = _xor_encode(indexes, np.asarray(values, dtype=np.float64).view(np.uint64))
+
+    columns = [zlib.compress("\n".join(block_uuids.tolist()).encode("utf-8")),
+               zlib.compress(deltas.tobytes()),
+               zlib.compress(indexes.tobytes()),
+               zlib.compress(bits.tobytes())]
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(timestamps), int(timestamps[0]),
+                               *[len(c) for c in columns])
+    return header + b"".join(columns)
+
+
+def iter_blocks(data):
+    """Yield (block uuids, timestamps, indexes, xor encoded bits) per block."""
+    offset = 0
+    while offset + BLOCK_HEADER.size <= len(data):
+        magic, rows, first, *sizes = BLOCK_HEADER.unpack_from(data, offset)
+        if magic != BLOCK_MAGIC:
+            _LOGGER.warning("archive: corrupt block at offset %d", offset)
+            return
+        offset += BLOCK_HEADER.size
+        columns = []
+        for size in sizes:
+            columns.append(zlib.decompress(data[offset:offset + size]))
+            offset += size
+        block_uuids = columns[0].decode("utf-8").split("\n")
+        timestamps = np.cumsum(np.frombuffer(columns[1], dtype=np.int64)) + first
+        indexes = np.frombuffer(columns[2], dtype=np.uint32)
+        bits = np.frombuffer(columns[3], dtype=np.uint64)
+        yield block_uuids, timestamps, indexes, bits
+
+
+class LoxoneArchive:
+    """Buffers value state changes and appends them to the daily files."""
+
+    def __init__(self, path):
+        self._path = path
+        self._pending = []
+
+    @property
+    def path(self):
+        return self._path
+
+    def append(self, uuids, values, timestamp=None):
+        """Buffer one decoded type 2 message."""
+        if len(uuids) == 0:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        self._pending.append((timestamp, uuids, np.array(values, dtype=np.float64)))
+
+    def take_pending(self):
+        """Return and clear the buffered rows. Call from the event loop."""
+        pending = self._pending
+        self._pending = []
+        return pending
+
+    def write(self, pending):
+        """Append buffered rows to the daily files. Does blocking I/O."""
+        by_day = {}
+        for timestamp, uuids, values in pending:
+            by_day.setdefault(_archive_day(timestamp), []).append((timestamp, uuids, values))
+
+        os.makedirs(self._path, exist_ok=True)
+        for day, rows in by_day.items():
+            timestamps = np.concatenate(
+                [np.full(len(uuids), int(timestamp * 1000), dtype=np.int64) for timestamp, uuids, _ in rows])
+            uuids = [uuid for _, row_uuids, _ in rows for uuid in row_uuids]
+            values = np.concatenate([values for _, _, values in rows])
+            with open(os.path.join(self._path, day + ARCHIVE_SUFFIX), "ab") as archive_file:
+                archive_file.write(encode_block(timestamps, uuids, values))
+
+    def flush(self):
+        self.write(self.take_pending())
+
+    def query(self, uuid, start, end):
+        """Return (timestamps in seconds, values) of a uuid between start and end.
+
+        start and end are unix timestamps. Does blocking I/O.
+        """
+        times = []
+        values = []
+        day = datetime.datetime.utcfromtimestamp(start).date()
+        last_day = datetime.datetime.utcfromtimestamp(end).date()
+        while day <= last_day:
+            filename = os.path.join(self._path, day.strftime("%Y-%m-%d") + ARCHIVE_SUFFIX)
+            day += datetime.timedelta(days=1)
+            if not os.path.exists(filename):
+                continue
+            with open(filename, "rb") as archive_file:
+                data = archive_file.read()
+            for block_uuids, timestamps, indexes, bits in iter_blocks(data):
+                if uuid not in block_uuids:
+                    continue
+                rows = indexes == block_uuids.index(uuid)
+                # the XOR chain of one uuid only depends on its own rows
+                decoded = np.bitwise_xor.accumulate(bits[rows]).view(np.float64)
+                seconds = timestamps[rows] / 1000.
+                in_range = (seconds >= start) & (seconds <= end)
+                times.append(seconds[in_range])
+                values.append(decoded[in_range])
+
+        if not times:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+        return np.concatenate(times), np.concatenate(values)
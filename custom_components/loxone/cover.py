@@ -8,8 +8,9 @@ from homeassistant.components.cover import (
     CoverDevice, SUPPORT_OPEN, SUPPORT_CLOSE, ATTR_POSITION)
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE)
-from homeassistant.helpers.event import track_utc_time_change
-from . import get_room_name_from_room_uuid, get_cat_name_from_cat_uuid, get_all_covers
+from . import get_room_name_from_room_uuid, get_cat_name_from_cat_uuid, get_all_covers, \
+    get_miniserver_version, LoxoneEntity, async_add_loxone_entities, get_miniserver_name
+from .dispatcher import PRIORITY_INTERACTIVE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,6 +27,9 @@ SUPPORT_CLOSE_TILT = 32
 SUPPORT_STOP_TILT = 64
 SUPPORT_SET_TILT_POSITION = 128
 
+# First Miniserver version which understands manualPosition/<pos> for Jalousies
+MANUAL_POSITION_MIN_VERSION = (10, 0)
+
 
 async def async_setup_platform(hass, config, async_add_devices, discovery_info={}):
     """Set up the Demo covers."""
@@ -33,46 +37,46 @@ async def async_setup_platform(hass, config, async_add_devices, discovery_info={
     if value_template is not None:
         value_template.hass = hass
 
-    config = hass.data[DOMAIN]
-    loxconfig = config['loxconfig']
-
-    devices = []
-
-    for cover in get_all_covers(loxconfig):
-        if cover['type'] == "Gate":
-            new_gate = LoxoneGate(hass, cover['name'],
-                                  cover['uuidAction'],
-                                  position_uuid=cover['states']['position'],
-                                  state_uuid=cover['states']['active'],
-                                  device_class="Gate",
-                                  room=get_room_name_from_room_uuid(loxconfig, cover.get('room', '')),
-                                  cat=get_cat_name_from_cat_uuid(loxconfig, cover.get('cat', '')),
-                                  complete_data=cover)
-            devices.append(new_gate)
-            hass.bus.async_listen(EVENT, new_gate.event_handler)
-        else:
-            new_jalousie = LoxoneJalousie(hass, cover['name'],
-                                          cover['uuidAction'],
-                                          position_uuid=cover['states'][
-                                              'position'],
-                                          shade_uuid=cover['states'][
-                                              'shadePosition'],
-                                          down_uuid=cover['states']['down'],
-                                          up_uuid=cover['states']['up'],
-                                          device_class="Jalousie",
-                                          room=get_room_name_from_room_uuid(loxconfig, cover.get('room', '')),
-                                          cat=get_cat_name_from_cat_uuid(loxconfig, cover.get('cat', '')),
-                                          complete_data=cover)
-
-            devices.append(new_jalousie)
-            hass.bus.async_listen(EVENT, new_jalousie.event_handler)
-
-    async_add_devices(devices)
+    def build_entities(loxconfig):
+        devices = {}
+        native_position = get_miniserver_version(loxconfig) >= MANUAL_POSITION_MIN_VERSION
+
+        for cover in get_all_covers(loxconfig):
+            if cover['type'] == "Gate":
+                new_gate = LoxoneGate(hass, cover['name'],
+                                      cover['uuidAction'],
+                                      position_uuid=cover['states']['position'],
+                                      state_uuid=cover['states']['active'],
+                                      device_class="Gate",
+                                      room=get_room_name_from_room_uuid(loxconfig, cover.get('room', '')),
+                                      cat=get_cat_name_from_cat_uuid(loxconfig, cover.get('cat', '')),
+                                      complete_data=cover)
+                devices[cover['uuidAction']] = new_gate
+            else:
+                new_jalousie = LoxoneJalousie(hass, cover['name'],
+                                              cover['uuidAction'],
+                                              position_uuid=cover['states'][
+                                                  'position'],
+                                              shade_uuid=cover['states'][
+                                                  'shadePosition'],
+                                              down_uuid=cover['states']['down'],
+                                              up_uuid=cover['states']['up'],
+                                              device_class="Jalousie",
+                                              room=get_room_name_from_room_uuid(loxconfig, cover.get('room', '')),
+                                              cat=get_cat_name_from_cat_uuid(loxconfig, cover.get('cat', '')),
+                                              complete_data=cover,
+                                              native_position=native_position)
+
+                devices[cover['uuidAction']] = new_jalousie
+        return devices
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
     return True
 
 
-class LoxoneGate(CoverDevice):
+class LoxoneGate(LoxoneEntity, CoverDevice):
     """Loxone Jalousie"""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, hass, name, uuid, position_uuid=None, state_uuid=None,
                  device_class=None, room="", cat="", complete_data=None):
@@ -162,24 +166,25 @@ class LoxoneGate(CoverDevice):
                                      dict(uuid=self._uuid, value="close"))
             return
 
-    async def event_handler(self, event):
-        if self._position_uuid in event.data or self._state_uuid in event.data:
-            if self._position_uuid in event.data:
-                self._position = float(event.data[self._position_uuid]) * 100.
+    def update_from_data(self, data):
+        if self._position_uuid in data or self._state_uuid in data:
+            if self._position_uuid in data:
+                self._position = float(data[self._position_uuid]) * 100.
                 if self._position == 0:
                     self._closed = True
                 else:
                     self._closed = False
 
-            if self._state_uuid in event.data:
+            if self._state_uuid in data:
                 self._is_closing = False
                 self._is_opening = False
 
-                if event.data[self._state_uuid] == -1:
+                if data[self._state_uuid] == -1:
                     self._is_opening = True
-                elif event.data[self._state_uuid] == 1:
+                elif data[self._state_uuid] == 1:
                     self._is_opening = True
-            self.schedule_update_ha_state()
+            return True
+        return False
 
     @property
     def device_state_attributes(self):
@@ -191,13 +196,15 @@ class LoxoneGate(CoverDevice):
                 "plattform": "loxone"}
 
 
-class LoxoneJalousie(CoverDevice):
+class LoxoneJalousie(LoxoneEntity, CoverDevice):
     """Loxone Jalousie"""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     # pylint: disable=no-self-use
     def __init__(self, hass, name, uuid, position_uuid=None,
                  shade_uuid=None, down_uuid=None, up_uuid=None,
-                 device_class=None, room="", cat="", complete_data=None):
+                 device_class=None, room="", cat="", complete_data=None,
+                 native_position=False):
         self.hass = hass
         self._name = name
         self._uuid = uuid
@@ -214,8 +221,8 @@ class LoxoneJalousie(CoverDevice):
         self._set_tilt_position = None
         self._tilt_position = None
         self._requested_closing = True
-        self._unsub_listener_cover = None
-        self._unsub_listener_cover_tilt = None
+        self._native_position = native_position
+        self._last_position_step = 0.
         self._is_opening = False
         self._is_closing = False
         self._complete_data = complete_data
@@ -234,34 +241,39 @@ class LoxoneJalousie(CoverDevice):
             supported_features |= (SUPPORT_OPEN_TILT | SUPPORT_CLOSE_TILT)
         return supported_features
 
-    async def event_handler(self, event):
-        if self._position_uuid in event.data or \
-                self._shade_uuid in event.data or \
-                self._up_uuid in event.data or \
-                self._down_uuid in event.data:
-            if self._position_uuid in event.data:
+    def update_from_data(self, data):
+        if self._position_uuid in data or \
+                self._shade_uuid in data or \
+                self._up_uuid in data or \
+                self._down_uuid in data:
+            if self._position_uuid in data:
                 self._position_loxone = float(
-                    event.data[self._position_uuid]) * 100.
-                self._position = round(100. - self._position_loxone, 0)
+                    data[self._position_uuid]) * 100.
+                position = round(100. - self._position_loxone, 0)
+                if self._position is not None:
+                    self._last_position_step = abs(position - self._position)
+                self._position = position
+                self._check_target_position()
 
                 if self._position == 0:
                     self._closed = True
                 else:
                     self._closed = False
 
-            if self._shade_uuid in event.data:
-                if event.data[self._shade_uuid] == 1:
+            if self._shade_uuid in data:
+                if data[self._shade_uuid] == 1:
                     self._tilt_position = 0
                 else:
                     self._tilt_position = 100
 
-            if self._up_uuid in event.data:
-                self._is_opening = event.data[self._up_uuid]
+            if self._up_uuid in data:
+                self._is_opening = data[self._up_uuid]
 
-            if self._down_uuid in event.data:
-                self._is_closing = event.data[self._down_uuid]
+            if self._down_uuid in data:
+                self._is_closing = data[self._down_uuid]
 
-            self.schedule_update_ha_state()
+            return True
+        return False
 
     @property
     def name(self):
@@ -365,10 +377,7 @@ class LoxoneJalousie(CoverDevice):
             self.hass.bus.async_fire(SENDDOMAIN,
                                      dict(uuid=self._uuid, value="FullDown"))
 
-        if self._unsub_listener_cover is not None:
-            self._unsub_listener_cover()
-            self._unsub_listener_cover = None
-            self._set_position = None
+        self._set_position = None
 
     def close_cover_tilt(self, **kwargs):
         """Close the cover tilt."""
@@ -387,29 +396,37 @@ class LoxoneJalousie(CoverDevice):
                                  dict(uuid=self._uuid, value="shade"))
 
     def set_cover_position(self, **kwargs):
-        """Return the current tilt position of the cover."""
+        """Move the cover to a specific position."""
         position = kwargs.get(ATTR_POSITION)
-        self._set_position = position
-        if self._position == position:
+        if self._native_position:
+            self._set_position = None
+            self.hass.bus.async_fire(SENDDOMAIN,
+                                     dict(uuid=self._uuid,
+                                          value="manualPosition/{}".format(100 - position)))
+            return
+
+        if self._position is None or self._position == position:
             return
+        self._set_position = position
         self._requested_closing = position < self._position
-        if position < self._position:
+        self._last_position_step = 0.
+        if self._requested_closing:
             self.close_cover()
         else:
             self.open_cover()
-        self._listen_cover()
 
-    def _listen_cover(self):
-        """Listen for changes in cover."""
-        if self._unsub_listener_cover is None:
-            self._unsub_listener_cover = track_utc_time_change(
-                self.hass, self._time_changed_cover)
+    def _check_target_position(self):
+        """Stop the cover once it reaches the requested position.
 
-    def _time_changed_cover(self, now):
-        """Track time changes."""
-        if abs(self._position - self._set_position) < 5:
-            self.stop_cover()
-        elif self._requested_closing and self._position <= self._set_position:
-            self.stop_cover()
-        elif not self._requested_closing and self._position >= self._set_position:
+        Called for every position update while a target is pending. The
+        cover is also stopped when less than half of the last observed step
+        remains, because waiting for the next update would overshoot by more
+        than stopping now undershoots.
+        """
+        if self._set_position is None:
+            return
+        remaining = self._set_position - self._position
+        if self._requested_closing:
+            remaining = -remaining
+        if remaining <= 0 or remaining * 2 < self._last_position_step:
             self.stop_cover()
@@ -0,0 +1,100 @@
+"""
+Hands decoded state updates to the entities interested in them.
+
+Every entity is registered with the state uuids of its control, so a batch
+only reaches the entities whose states are in it. The affected entities
+are updated in priority order (security before interactive devices before
+sensors), and the dispatcher yields to the event loop whenever a slice
+took longer than the time budget, so a large batch does not block other
+integrations. The fan-out of the single frames (events, history, ...)
+runs in the same slices before the entities are updated.
+"""
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_SECURITY = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_DEFAULT = 2
+
+DEFAULT_DISPATCH_BUDGET = 0.005
+
+
+class LoxoneDispatcher:
+    """Uuid index of the entities of one Miniserver."""
+
+    def __init__(self, budget=DEFAULT_DISPATCH_BUDGET):
+        self._budget = budget
+        # Entities are keyed by id(), Home Assistant entities define __eq__
+        # state uuid -> {id: entity}
+        self._index = {}
+        # entities without known state uuids get every batch
+        self._unindexed = {}
+        self._uuids = {}
+        # optional LoxoneWatchdog, gets the time spent per entity
+        self.watchdog = None
+
+    def register(self, entity, uuids):
+        """Register an entity for a set of state uuids (None for all)."""
+        key = id(entity)
+        if uuids is None:
+            self._unindexed[key] = entity
+            self._uuids[key] = ()
+            return
+        self._uuids[key] = set(uuids)
+        for uuid in self._uuids[key]:
+            self._index.setdefault(uuid, {})[key] = entity
+
+    def unregister(self, entity):
+        key = id(entity)
+        self._unindexed.pop(key, None)
+        for uuid in self._uuids.pop(key, ()):
+            entities = self._index.get(uuid)
+            if entities is not None:
+                entities.pop(key, None)
+                if not entities:
+                    del self._index[uuid]
+
+    def affected_entities(self, states):
+        """Return the entities interested in a batch, highest priority first.
+
+        The priority is the dispatch_priority attribute of the entity.
+        """
+        affected = dict(self._unindexed)
+        index = self._index
+        for uuid in states:
+            entities = index.get(uuid)
+            if entities is not None:
+                affected.update(entities)
+        return sorted(affected.values(), key=lambda entity: entity.dispatch_priority)
+
+    async def dispatch(self, states, frames=(), fan_out=None):
+        """Update the affected entities, yielding whenever the budget is used.
+
+        fan_out(frame) is called for every item of frames first, under the
+        same budget.
+        """
+        slice_start = time.perf_counter()
+        if fan_out is not None:
+            for frame in frames:
+                fan_out(frame)
+                if time.perf_counter() - slice_start > self._budget:
+                    await asyncio.sleep(0)
+                    slice_start = time.perf_counter()
+        entities = self.affected_entities(states)
+        watchdog = self.watchdog
+        for entity in entities:
+            started = time.perf_counter()
+            try:
+                if entity.update_from_data(states):
+                    entity.async_schedule_update_ha_state()
+            except Exception:
+                _LOGGER.exception("error updating {}".format(entity.entity_id))
+            now = time.perf_counter()
+            if watchdog is not None:
+                watchdog.handler(entity.entity_id, now - started)
+            if now - slice_start > self._budget:
+                await asyncio.sleep(0)
+                slice_start = time.perf_counter()
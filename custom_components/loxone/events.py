@@ -0,0 +1,60 @@
+"""
+Compact per-uuid events for selected states.
+
+Instead of one loxone_event with every decoded state, a loxone_state event
+{"uuid": ..., "value": ...} is fired only for the uuids somebody is
+interested in (from the configuration or the subscribe_events service).
+Changes are collected for a short interval and only the latest value of
+each uuid is fired.
+"""
+import logging
+
+from homeassistant.core import callback
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_STATE = "loxone_state"
+DEFAULT_EVENT_INTERVAL = 0.1
+
+
+class LoxoneStateEvents:
+    def __init__(self, hass, event_type, uuids=(), interval=DEFAULT_EVENT_INTERVAL):
+        self._hass = hass
+        self._event_type = event_type
+        self._uuids = set(uuids)
+        self._interval = interval
+        self._pending = {}
+        self._flush_scheduled = False
+
+    @property
+    def uuids(self):
+        return self._uuids
+
+    def subscribe(self, uuids):
+        self._uuids.update(uuids)
+
+    def unsubscribe(self, uuids):
+        self._uuids.difference_update(uuids)
+
+    @callback
+    def publish(self, states):
+        """Collect the subscribed states of a decoded message."""
+        if len(self._uuids) < len(states):
+            changed = {uuid: states[uuid] for uuid in self._uuids if uuid in states}
+        else:
+            changed = {uuid: value for uuid, value in states.items() if uuid in self._uuids}
+        if not changed:
+            return
+        self._pending.update(changed)
+        if self._interval <= 0:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._hass.loop.call_later(self._interval, self._flush)
+
+    @callback
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        for uuid, value in pending.items():
+            self._hass.bus.async_fire(self._event_type, {"uuid": uuid, "value": value})
@@ -0,0 +1,98 @@
+"""
+In-memory history of selected Miniserver states.
+"""
+import logging
+import time
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """Fixed size buffer of (timestamp, value) samples."""
+
+    def __init__(self, size):
+        self._times = np.zeros(size, dtype=np.float64)
+        self._values = np.zeros(size, dtype=np.float64)
+        self._size = size
+        self._count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, value):
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def samples(self):
+        """Return (timestamps, values) in chronological order."""
+        if self._count < self._size:
+            return self._times[:self._count], self._values[:self._count]
+        order = np.roll(np.arange(self._size), -self._next)
+        return self._times[order], self._values[order]
+
+    def statistics(self, window, now=None):
+        """Return min/max/mean/change rate over the last window seconds.
+
+        The Miniserver only sends changes, so a value is valid until the next
+        sample. The mean is therefore weighted by how long each value was
+        held, and the last value before the window counts from the window
+        start. change_rate is the value change per second over the window.
+        """
+        if self._count == 0:
+            return None
+        if now is None:
+            now = time.time()
+        start = now - window
+        times, values = self.samples()
+        first = max(np.searchsorted(times, start, side='right') - 1, 0)
+        times = np.clip(times[first:], start, now)
+        values = values[first:]
+
+        durations = np.diff(np.append(times, now))
+        total = durations.sum()
+        if total > 0:
+            mean = float(np.dot(values, durations) / total)
+        else:
+            mean = float(values[-1])
+
+        elapsed = times[-1] - times[0]
+        change_rate = float((values[-1] - values[0]) / elapsed) if elapsed > 0 else 0.0
+        return {"min_value": float(values.min()),
+                "max_value": float(values.max()),
+                "mean": mean,
+                "change_rate": change_rate,
+                "count": int(len(values))}
+
+
+class LoxoneHistory:
+    """Ring buffers for the state uuids selected in the configuration."""
+
+    def __init__(self, uuids, window, size):
+        self._buffers = {uuid: RingBuffer(size) for uuid in uuids}
+        self._window = window
+
+    def __contains__(self, uuid):
+        return uuid in self._buffers
+
+    def record(self, event_data, timestamp=None):
+        """Record the tracked uuids contained in a decoded message."""
+        if timestamp is None:
+            timestamp = time.time()
+        for uuid, buffer in self._buffers.items():
+            if uuid in event_data:
+                try:
+                    buffer.append(timestamp, float(event_data[uuid]))
+                except (TypeError, ValueError):
+                    _LOGGER.debug("history: ignoring non numeric value for %s", uuid)
+
+    def statistics(self, uuid, window=None):
+        """Return the windowed statistics of a tracked uuid, or None."""
+        buffer = self._buffers.get(uuid)
+        if buffer is None:
+            return None
+        return buffer.statistics(self._window if window is None else window)
@@ -1,5 +1,8 @@
 import asyncio
+import json
 import logging
+import re
+from functools import lru_cache
 from typing import Any
 
 import homeassistant.util.color as color_util
@@ -17,11 +20,16 @@ from homeassistant.components.light import (
 )
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE)
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 
 from . import get_room_name_from_room_uuid, \
     get_cat_name_from_cat_uuid, \
     get_all_light_controller, \
-    get_all_dimmer
+    get_all_dimmer, \
+    LoxoneEntity, \
+    SIGNAL_MOODLIST_CHANGED, \
+    async_add_loxone_entities, get_miniserver_name
+from .dispatcher import PRIORITY_INTERACTIVE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -36,6 +44,8 @@ SENDDOMAIN = "loxone_send"
 STATE_ON = "on"
 STATE_OFF = "off"
 
+COLOR_PATTERN = re.compile(r"^\s*(hsv|temp)\(([^)]*)\)\s*$")
+
 
 def to_hass_level(level):
     """Convert the given Loxone (0.0-100.0) light level to HASS (0-255)."""
@@ -57,6 +67,55 @@ def to_loxone_color_temp(temp):
     return np.interp(temp, [153, 500], [6500, 2700])
 
 
+@lru_cache(maxsize=64)
+def parse_mood_list(raw):
+    """Parse a Loxone mood list (activeMoods, moodList, additionalMoods).
+
+    The Miniserver re-sends identical lists frequently, so the parsed result
+    is cached by the raw string. A tuple is returned because the cached
+    object is shared between all callers.
+    """
+    if not isinstance(raw, str):
+        return ()
+    try:
+        moods = json.loads(raw)
+    except ValueError:
+        _LOGGER.warning("unable to parse mood list: %s", raw)
+        return ()
+    if not isinstance(moods, list):
+        return ()
+    return tuple(moods)
+
+
+def _to_number(value):
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+@lru_cache(maxsize=256)
+def parse_color(raw):
+    """Parse a Loxone colour string like hsv(0,100,100) or temp(100,2700).
+
+    Returns a tuple (kind, values) or None if the string is not a colour.
+    """
+    if not isinstance(raw, str):
+        return None
+    match = COLOR_PATTERN.match(raw)
+    if match is None:
+        return None
+    try:
+        values = tuple(_to_number(v) for v in match.group(2).split(","))
+    except ValueError:
+        return None
+    kind = match.group(1)
+    if (kind == "hsv" and len(values) != 3) or (kind == "temp" and len(values) != 2):
+        return None
+    return kind, values
+
+
 async def async_setup_platform(hass, config, async_add_devices,
                                discovery_info=None):
     """Set up Loxone Light Controller."""
@@ -67,98 +126,92 @@ async def async_setup_platform(hass, config, async_add_devices,
     if value_template is not None:
         value_template.hass = hass
 
-    config = hass.data[DOMAIN]
-    loxconfig = config['loxconfig']
-    devices = []
-    all_dimmers = []
-    all_color_picker = []
-    all_switches = []
-
-    for light_controller in get_all_light_controller(loxconfig):
-        new_light_controller = LoxonelightcontrollerV2(name=light_controller['name'],
-                                                       uuid=light_controller['uuidAction'],
-                                                       sensortyp="lightcontrollerv2",
-                                                       room=get_room_name_from_room_uuid(loxconfig,
-                                                                                         light_controller.get('room',
-                                                                                                              '')),
-                                                       cat=get_cat_name_from_cat_uuid(loxconfig,
-                                                                                      light_controller.get('cat', '')),
-                                                       complete_data=light_controller,
-                                                       async_add_devices=async_add_devices)
-
-        if 'subControls' in light_controller:
-            if len(light_controller['subControls']) > 0:
-                for sub_controll in light_controller['subControls']:
-                    if light_controller['subControls'][sub_controll]['type'] == "Dimmer":
-                        light_controller['subControls'][sub_controll]['room'] = light_controller.get('room', '')
-                        light_controller['subControls'][sub_controll]['cat'] = light_controller.get('cat', '')
-                        all_dimmers.append(light_controller['subControls'][sub_controll])
-                    elif light_controller['subControls'][sub_controll]['type'] == "Switch":
-                        light_controller['subControls'][sub_controll]['room'] = light_controller.get('room', '')
-                        light_controller['subControls'][sub_controll]['cat'] = light_controller.get('cat', '')
-                        all_switches.append(light_controller['subControls'][sub_controll])
-
-                    elif light_controller['subControls'][sub_controll]['type'] == "ColorPickerV2":
-                        light_controller['subControls'][sub_controll]['room'] = light_controller.get('room', '')
-                        light_controller['subControls'][sub_controll]['cat'] = light_controller.get('cat', '')
-                        all_color_picker.append(light_controller['subControls'][sub_controll])
-
-        hass.bus.async_listen(EVENT, new_light_controller.event_handler)
-        devices.append(new_light_controller)
-
-    all_dimmers += get_all_dimmer(loxconfig)
-
-    for dimmer in all_dimmers:
-        new_dimmer = LoxoneDimmer(name=dimmer['name'],
-                                  uuid=dimmer['uuidAction'],
-                                  uuid_position=dimmer['states']['position'],
-                                  sensortyp="dimmer",
-                                  room=get_room_name_from_room_uuid(loxconfig,
-                                                                    dimmer.get('room', '')),
-                                  cat=get_cat_name_from_cat_uuid(loxconfig,
-                                                                 dimmer.get('cat', '')),
-                                  complete_data=dimmer,
-                                  async_add_devices=async_add_devices)
-
-        hass.bus.async_listen(EVENT, new_dimmer.event_handler)
-        devices.append(new_dimmer)
-
-    for switch in all_switches:
-        new_switch = LoxoneLight(name=switch['name'],
-                                 uuid=switch['states']['active'],
-                                 action_uuid=switch['uuidAction'],
-                                 sensortyp="switch",
-                                 room=get_room_name_from_room_uuid(loxconfig,
-                                                                   dimmer.get('room', '')),
-                                 cat=get_cat_name_from_cat_uuid(loxconfig,
-                                                                dimmer.get('cat', '')),
-                                 complete_data=dimmer,
-                                 async_add_devices=async_add_devices)
-
-        hass.bus.async_listen(EVENT, new_switch.event_handler)
-        devices.append(new_switch)
-
-    for color_picker in all_color_picker:
-        new_color_picker = LoxoneColorPickerV2(name=color_picker['name'],
-                                               color_uuid=color_picker['states']['color'],
-                                               action_uuid=color_picker['uuidAction'],
-                                               sensortyp="colorpicker",
-                                               room=get_room_name_from_room_uuid(loxconfig,
-                                                                                 color_picker.get('room', '')),
-                                               cat=get_cat_name_from_cat_uuid(loxconfig,
-                                                                              color_picker.get('cat', '')),
-                                               complete_data=color_picker,
-                                               async_add_devices=async_add_devices)
-
-        hass.bus.async_listen(EVENT, new_color_picker.event_handler)
-        devices.append(new_color_picker)
-
-    async_add_devices(devices)
+    def build_entities(loxconfig):
+        devices = {}
+        all_dimmers = []
+        all_color_picker = []
+        all_switches = []
+
+        for light_controller in get_all_light_controller(loxconfig):
+            new_light_controller = LoxonelightcontrollerV2(name=light_controller['name'],
+                                                           uuid=light_controller['uuidAction'],
+                                                           sensortyp="lightcontrollerv2",
+                                                           room=get_room_name_from_room_uuid(loxconfig,
+                                                                                             light_controller.get('room',
+                                                                                                                  '')),
+                                                           cat=get_cat_name_from_cat_uuid(loxconfig,
+                                                                                          light_controller.get('cat', '')),
+                                                           complete_data=light_controller,
+                                                           async_add_devices=async_add_devices)
+
+            if 'subControls' in light_controller:
+                if len(light_controller['subControls']) > 0:
+                    for sub_controll in light_controller['subControls']:
+                        # copy, the structure file is compared on reload
+                        sub_control = dict(light_controller['subControls'][sub_controll],
+                                           room=light_controller.get('room', ''),
+                                           cat=light_controller.get('cat', ''))
+                        if sub_control['type'] == "Dimmer":
+                            all_dimmers.append(sub_control)
+                        elif sub_control['type'] == "Switch":
+                            all_switches.append(sub_control)
+                        elif sub_control['type'] == "ColorPickerV2":
+                            all_color_picker.append(sub_control)
+
+            devices[light_controller['uuidAction']] = new_light_controller
+
+        all_dimmers += get_all_dimmer(loxconfig)
+
+        for dimmer in all_dimmers:
+            new_dimmer = LoxoneDimmer(name=dimmer['name'],
+                                      uuid=dimmer['uuidAction'],
+                                      uuid_position=dimmer['states']['position'],
+                                      sensortyp="dimmer",
+                                      room=get_room_name_from_room_uuid(loxconfig,
+                                                                        dimmer.get('room', '')),
+                                      cat=get_cat_name_from_cat_uuid(loxconfig,
+                                                                     dimmer.get('cat', '')),
+                                      complete_data=dimmer,
+                                      async_add_devices=async_add_devices)
+
+            devices[dimmer['uuidAction']] = new_dimmer
+
+        for switch in all_switches:
+            new_switch = LoxoneLight(name=switch['name'],
+                                     uuid=switch['states']['active'],
+                                     action_uuid=switch['uuidAction'],
+                                     sensortyp="switch",
+                                     room=get_room_name_from_room_uuid(loxconfig,
+                                                                       switch.get('room', '')),
+                                     cat=get_cat_name_from_cat_uuid(loxconfig,
+                                                                    switch.get('cat', '')),
+                                     complete_data=switch,
+                                     async_add_devices=async_add_devices)
+
+            devices[switch['uuidAction']] = new_switch
+
+        for color_picker in all_color_picker:
+            new_color_picker = LoxoneColorPickerV2(name=color_picker['name'],
+                                                   color_uuid=color_picker['states']['color'],
+                                                   action_uuid=color_picker['uuidAction'],
+                                                   sensortyp="colorpicker",
+                                                   room=get_room_name_from_room_uuid(loxconfig,
+                                                                                     color_picker.get('room', '')),
+                                                   cat=get_cat_name_from_cat_uuid(loxconfig,
+                                                                                  color_picker.get('cat', '')),
+                                                   complete_data=color_picker,
+                                                   async_add_devices=async_add_devices)
+
+            devices[color_picker['uuidAction']] = new_color_picker
+        return devices
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
     return True
 
 
-class LoxonelightcontrollerV2(Light):
+class LoxonelightcontrollerV2(LoxoneEntity, Light):
     """Representation of a Sensor."""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, name, uuid, sensortyp, room="", cat="",
                  complete_data=None, async_add_devices=None):
@@ -175,9 +228,12 @@ class LoxonelightcontrollerV2(Light):
         self._moodlist_uuid = ""
         self._favorite_mood_uuid = ""
         self._additional_mood_uuid = ""
-        self._active_moods = []
-        self._moodlist = []
-        self._additional_moodlist = []
+        self._active_moods = ()
+        self._moodlist = ()
+        self._mood_name_by_id = {}
+        self._mood_id_by_name = {}
+        self._effect_list = []
+        self._additional_moodlist = ()
         self._async_add_devices = async_add_devices
 
         if "states" in self._data:
@@ -221,28 +277,43 @@ class LoxonelightcontrollerV2(Light):
         """Return the icon to use in the frontend, if any."""
         return None
 
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.hass.data[DOMAIN]['light_controllers'][self._uuid] = self
+        async_dispatcher_send(self.hass, SIGNAL_MOODLIST_CHANGED, self)
+
+    async def async_will_remove_from_hass(self):
+        await super().async_will_remove_from_hass()
+        self.hass.data[DOMAIN]['light_controllers'].pop(self._uuid, None)
+        async_dispatcher_send(self.hass, SIGNAL_MOODLIST_CHANGED, self)
+
+    def _set_moodlist(self, moodlist):
+        """Store a new mood list and rebuild the name/id lookup tables."""
+        if moodlist is self._moodlist:
+            return
+        self._moodlist = moodlist
+        self._mood_name_by_id = {}
+        self._mood_id_by_name = {}
+        self._effect_list = []
+        for mood in moodlist:
+            if "name" in mood:
+                self._effect_list.append(mood['name'])
+                if "id" in mood:
+                    self._mood_name_by_id.setdefault(mood['id'], mood['name'])
+                    self._mood_id_by_name.setdefault(mood['name'], mood['id'])
+        if self.hass is not None:
+            async_dispatcher_send(self.hass, SIGNAL_MOODLIST_CHANGED, self)
+
     def get_moodname_by_id(self, _id):
-        for mood in self._moodlist:
-            if "id" in mood and "name" in mood:
-                if mood['id'] == _id:
-                    return mood['name']
-        return _id
+        return self._mood_name_by_id.get(_id, _id)
 
     def get_id_by_moodname(self, _name):
-        for mood in self._moodlist:
-            if "id" in mood and "name" in mood:
-                if mood['name'] == _name:
-                    return mood['id']
-        return _name
+        return self._mood_id_by_name.get(_name, _name)
 
     @property
     def effect_list(self):
         """Return the moods of light controller."""
-        moods = []
-        for mood in self._moodlist:
-            if "name" in mood:
-                moods.append(mood['name'])
-        return moods
+        return self._effect_list
 
     @property
     def effect(self):
@@ -290,28 +361,25 @@ class LoxonelightcontrollerV2(Light):
         """Return the name of the device if any."""
         return self._name
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         request_update = False
-        if self._uuid in event.data:
-            self._state = event.data[self._uuid]
+        if self._uuid in data:
+            self._state = data[self._uuid]
             request_update = True
 
-        if self._active_mood_uuid in event.data:
-            self._active_moods = eval(event.data[self._active_mood_uuid])
+        if self._active_mood_uuid in data:
+            self._active_moods = parse_mood_list(data[self._active_mood_uuid])
             request_update = True
 
-        if self._moodlist_uuid in event.data:
-            event.data[self._moodlist_uuid] = event.data[self._moodlist_uuid].replace("true", "True")
-            event.data[self._moodlist_uuid] = event.data[self._moodlist_uuid].replace("false", "False")
-            self._moodlist = eval(event.data[self._moodlist_uuid])
+        if self._moodlist_uuid in data:
+            self._set_moodlist(parse_mood_list(data[self._moodlist_uuid]))
             request_update = True
 
-        if self._additional_mood_uuid in event.data:
-            self._additional_moodlist = eval(event.data[self._additional_mood_uuid])
+        if self._additional_mood_uuid in data:
+            self._additional_moodlist = parse_mood_list(data[self._additional_mood_uuid])
             request_update = True
 
-        if request_update:
-            self.async_schedule_update_ha_state()
+        return request_update
 
     @property
     def state(self):
@@ -320,7 +388,7 @@ class LoxonelightcontrollerV2(Light):
 
     @property
     def is_on(self) -> bool:
-        if self._active_moods != [778]:
+        if self._active_moods != (778,):
             return True
         else:
             return False
@@ -341,8 +409,9 @@ class LoxonelightcontrollerV2(Light):
         return SUPPORT_EFFECT
 
 
-class LoxoneLight(ToggleEntity):
+class LoxoneLight(LoxoneEntity, ToggleEntity):
     """Representation of a light."""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, name, uuid, action_uuid, sensortyp, room="", cat="",
                  complete_data=None, async_add_devices=None):
@@ -402,17 +471,18 @@ class LoxoneLight(ToggleEntity):
         """Flag supported features."""
         return 0
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         request_update = False
-        if self._uuid in event.data:
-            self._state = event.data[self._uuid]
+        if self._uuid in data:
+            self._state = data[self._uuid]
             request_update = True
 
-        if request_update:
-            self.async_schedule_update_ha_state()
+        return request_update
+
 
+class LoxoneColorPickerV2(LoxoneEntity, Light):
+    dispatch_priority = PRIORITY_INTERACTIVE
 
-class LoxoneColorPickerV2(Light):
     def __init__(self, name, color_uuid, action_uuid, sensortyp, room="", cat="",
                  complete_data=None, async_add_devices=None):
         self._name = name
@@ -486,29 +556,24 @@ class LoxoneColorPickerV2(Light):
                 "category": self._cat,
                 "device_typ": self._sensortyp, "plattform": "loxone"}
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         request_update = False
-        if self._color_uuid in event.data:
-            color = event.data[self._color_uuid]
-            if color.startswith('hsv'):
-                color = color.replace('hsv', '')
-                color = eval(color)
-                self._rgb_color = color_util.color_hs_to_RGB(color[0], color[1])
-                self._position = color[2]
-                request_update = True
-
-            elif color.startswith('temp'):
-                color = color.replace('temp', '')
-                color = eval(color)
-                self._color_temp = to_hass_color_temp(color[1])
-                self._position = color[0]
+        if self._color_uuid in data:
+            color = parse_color(data[self._color_uuid])
+            if color is not None:
+                kind, values = color
+                if kind == "hsv":
+                    self._rgb_color = color_util.color_hs_to_RGB(values[0], values[1])
+                    self._position = values[2]
+                else:
+                    self._color_temp = to_hass_color_temp(values[1])
+                    self._position = values[0]
                 request_update = True
 
-        if self._action_uuid in event.data:
+        if self._action_uuid in data:
             pass
 
-        if request_update:
-            self.async_schedule_update_ha_state()
+        return request_update
 
     @property
     def brightness(self):
@@ -540,8 +605,9 @@ class LoxoneColorPickerV2(Light):
         return SUPPORT_BRIGHTNESS | SUPPORT_COLOR | SUPPORT_COLOR_TEMP
 
 
-class LoxoneDimmer(Light):
+class LoxoneDimmer(LoxoneEntity, Light):
     """Representation of a Dimmer."""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, name, uuid, uuid_position, sensortyp, room="", cat="",
                  complete_data=None, async_add_devices=None):
@@ -600,14 +666,13 @@ class LoxoneDimmer(Light):
         self.hass.bus.async_fire(SENDDOMAIN, dict(uuid=self._uuid, value="off"))
         self.schedule_update_ha_state()
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         request_update = False
-        if self._uuid_position in event.data:
-            self._position = event.data[self._uuid_position]
+        if self._uuid_position in data:
+            self._position = data[self._uuid_position]
             request_update = True
 
-        if request_update:
-            self.async_schedule_update_ha_state()
+        return request_update
 
     @property
     def state(self):
@@ -0,0 +1,163 @@
+"""
+Local websocket endpoint sharing one Miniserver connection.
+
+The Miniserver only accepts a few websocket clients. Local tools connect
+to this endpoint instead and get the states decoded by the component:
+
+- the first client message must be {"token": <configured token>},
+- then one message with all known states,
+- then one message per batch of changes: {"states": {uuid: value, ...}}.
+
+Clients send commands as {"uuid": ..., "value": ...} (plus "code" for
+secured commands); they are forwarded over the component's connection.
+Connections from web browsers (with an Origin header) are rejected, so web
+pages cannot control the Miniserver through this endpoint.
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+from contextlib import suppress
+from http import HTTPStatus
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MULTIPLEXER_HOST = "127.0.0.1"
+DEFAULT_MULTIPLEXER_PORT = 8091
+# seconds a client has to send its token
+AUTH_TIMEOUT = 10
+# websocket close code for a missing or wrong token
+CLOSE_POLICY_VIOLATION = 1008
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def reject_browsers(path, request_headers):
+    """Refuse the websocket handshake of web pages."""
+    if "Origin" in request_headers:
+        _LOGGER.warning("multiplexer: rejected connection from origin {}".format(request_headers["Origin"]))
+        return HTTPStatus.FORBIDDEN, [], b"Forbidden\n"
+    return None
+
+
+class MultiplexerClient:
+    """One connected consumer.
+
+    Changes are merged into a pending dict while the client is busy, so a
+    slow client gets fewer, larger messages instead of an ever growing
+    queue.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def publish(self, states):
+        self._pending.update(states)
+        self._ready.set()
+
+    async def send_pending(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            states, self._pending = self._pending, {}
+            await self.websocket.send(json.dumps({"states": states}, default=str))
+
+
+class LoxoneMultiplexer:
+    """Websocket server re-publishing the updates of one LoxWs connection."""
+
+    def __init__(self, lox, state_store, token, host=DEFAULT_MULTIPLEXER_HOST, port=DEFAULT_MULTIPLEXER_PORT):
+        self._lox = lox
+        self._state_store = state_store
+        self._token = token
+        self._host = host
+        self._port = port
+        self._server = None
+        self._clients = set()
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    async def start(self):
+        import websockets as wslib
+        if not is_loopback(self._host):
+            _LOGGER.warning("multiplexer listens on {}, every host that can reach it and knows the "
+                            "token can control the Miniserver".format(self._host))
+        self._server = await wslib.serve(self._handle_client, self._host, self._port,
+                                         process_request=reject_browsers)
+        _LOGGER.info("multiplexer listening on {}:{}".format(self._host, self._port))
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def publish(self, states):
+        """Hand a decoded message to all clients. Call from the event loop."""
+        for client in self._clients:
+            client.publish(states)
+
+    async def _authenticate(self, websocket):
+        """Return True if the first message of the client has the right token."""
+        try:
+            message = json.loads(await asyncio.wait_for(websocket.recv(), AUTH_TIMEOUT))
+            token = message['token']
+        except (KeyError, TypeError, ValueError, asyncio.TimeoutError):
+            return False
+        return isinstance(token, str) and hmac.compare_digest(token, self._token)
+
+    async def _handle_client(self, websocket, path):
+        from websockets.exceptions import ConnectionClosed
+        try:
+            authenticated = await self._authenticate(websocket)
+        except ConnectionClosed:
+            return
+        if not authenticated:
+            _LOGGER.warning("multiplexer: rejected client {} without valid token".format(
+                websocket.remote_address))
+            await websocket.close(CLOSE_POLICY_VIOLATION, "invalid token")
+            return
+        client = MultiplexerClient(websocket)
+        client.publish(self._state_store.as_dict())
+        self._clients.add(client)
+        sender = asyncio.ensure_future(client.send_pending())
+        _LOGGER.debug("multiplexer client connected, {} clients".format(len(self._clients)))
+        try:
+            async for message in websocket:
+                await self._handle_command(message)
+        except Exception as err:
+            _LOGGER.debug("multiplexer client error: {}".format(err))
+        finally:
+            sender.cancel()
+            with suppress(asyncio.CancelledError, ConnectionClosed):
+                await sender
+            self._clients.discard(client)
+            _LOGGER.debug("multiplexer client disconnected, {} clients".format(len(self._clients)))
+
+    async def _handle_command(self, message):
+        try:
+            command = json.loads(message)
+            device_uuid = command['uuid']
+            value = command['value']
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.warning("multiplexer: ignoring invalid command {}".format(message))
+            return
+        try:
+            if 'code' in command:
+                await self._lox.send_secured__websocket_command(device_uuid, value, command['code'])
+            else:
+                await self._lox.send_websocket_command(device_uuid, value)
+        except Exception as err:
+            _LOGGER.error("multiplexer: unable to send command for {}: {}".format(device_uuid, err))
@@ -4,7 +4,10 @@ import logging
 from homeassistant.components.scene import Scene
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE)
-from homeassistant.helpers.entity_platform import async_call_later
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from . import SIGNAL_MOODLIST_CHANGED, get_miniserver, get_miniserver_name
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,25 +29,42 @@ async def async_setup_platform(hass, config, async_add_devices,
     if value_template is not None:
         value_template.hass = hass
 
-    config = hass.data[DOMAIN]
+    miniserver = get_miniserver_name(discovery_info)
+    if not get_miniserver(hass, miniserver)[CONF_SCENE_GEN]:
+        return True
+    light_controllers = hass.data[DOMAIN]['light_controllers']
+
+    # light controller uuid -> {mood name: scene}
+    scenes = {}
+
+    @callback
+    def async_sync_scenes(controller):
+        """Add, update and remove the scenes of one light controller."""
+        if controller.miniserver != miniserver:
+            return
+        current = scenes.setdefault(controller.uuid, {})
+        wanted = {}
+        if controller.uuid in light_controllers:
+            for effect in controller.effect_list:
+                wanted[effect] = controller.get_id_by_moodname(effect)
+
+        for effect in [e for e in current if e not in wanted]:
+            hass.async_create_task(current.pop(effect).async_remove())
 
-    async def async_call():
         devices = []
-        entity_ids = hass.states.async_entity_ids("LIGHT")
-        for _ in entity_ids:
-            state = hass.states.get(_)
-            att = state.attributes
-            if "plattform" in att and att['plattform'] == DOMAIN:
-                entity = hass.data['light'].get_entity(state.entity_id)
-                if entity.device_class == "lightcontrollerv2":
-                    for effect in entity.effect_list:
-                        mood_id = entity.get_id_by_moodname(effect)
-                        uuid = entity.uuid
-                        devices.append(Loxonelightscene("{}_{}".format(entity.name, effect), mood_id, uuid))
-        async_add_devices(devices)
-
-    if config[CONF_SCENE_GEN]:
-        async_call_later(hass, 0.2, async_call())
+        for effect, mood_id in wanted.items():
+            if effect in current:
+                current[effect].mood_id = mood_id
+            else:
+                scene = Loxonelightscene("{}_{}".format(controller.name, effect), mood_id, controller.uuid)
+                current[effect] = scene
+                devices.append(scene)
+        if devices:
+            async_add_devices(devices)
+
+    async_dispatcher_connect(hass, SIGNAL_MOODLIST_CHANGED, async_sync_scenes)
+    for controller in list(light_controllers.values()):
+        async_sync_scenes(controller)
     return True
 
 
@@ -54,6 +74,14 @@ class Loxonelightscene(Scene):
         self._mood_id = mood_id
         self._action_uuid = uuid
 
+    @property
+    def mood_id(self):
+        return self._mood_id
+
+    @mood_id.setter
+    def mood_id(self, mood_id):
+        self._mood_id = mood_id
+
     @property
     def name(self):
         """Return the name of the scene."""
@@ -1,22 +1,56 @@
 import asyncio
 import logging
+import re
+from datetime import timedelta
+from functools import lru_cache
 
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE, STATE_ON, STATE_OFF)
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
 
 from . import get_room_name_from_room_uuid, get_cat_name_from_cat_uuid
-from . import get_all_analog_info, get_all_digital_info
+from . import get_all_analog_info, get_all_digital_info, LoxoneEntity, async_add_loxone_entities, get_miniserver_name
 
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_NAME = 'Loxone Sensor'
 DEFAULT_FORCE_UPDATE = False
+# Sensors with history refresh their windowed statistics this often, also
+# while the value does not change
+HISTORY_REFRESH_INTERVAL = timedelta(seconds=30)
 
 CONF_UUID = "uuid"
 EVENT = "loxone_event"
 DOMAIN = 'loxone'
 
+# printf conversion (%.1f, %d, ...) or Loxone value placeholder (<v>, <v.1>)
+FORMAT_SPEC_PATTERN = re.compile(
+    r"(?P<printf>%[-+ #0]*\d*(?:\.\d+)?[diouxXeEfFgG])|<v(?:\.(?P<digits>\d+))?>")
+
+
+@lru_cache(maxsize=None)
+def compile_loxone_format(lox_format):
+    """Compile a Loxone format string into (formatter, unit).
+
+    The formatter is a callable rendering a value, or None if the format has
+    no numeric placeholder (e.g. <v.u> durations). Both printf formats like
+    "%.1f°C" or "%d %%" and Loxone placeholders like "<v.1> m" are
+    supported. Everything after the placeholder is the unit.
+    """
+    match = FORMAT_SPEC_PATTERN.search(lox_format)
+    if match is None:
+        return None, None
+    if match.group("printf") is not None:
+        formatter = match.group("printf").__mod__
+    elif match.group("digits") is not None:
+        formatter = "%.{}f".format(match.group("digits")).__mod__
+    else:
+        formatter = "%g".__mod__
+    unit = lox_format[match.end():].replace("%%", "%").strip()
+    return formatter, unit or None
+
 
 async def async_setup_platform(hass, config, async_add_devices,
                                discovery_info: object = {}):
@@ -26,36 +60,32 @@ async def async_setup_platform(hass, config, async_add_devices,
     if value_template is not None:
         value_template.hass = hass
 
-    config = hass.data[DOMAIN]
-    loxconfig = config['loxconfig']
-
-    devices = []
-    for sensor in get_all_analog_info(loxconfig):
-        new_sensor = Loxonesensor(name=sensor['name'],
-                                  uuid=sensor['uuidAction'],
-                                  sensortyp="analog",
-                                  room=get_room_name_from_room_uuid(loxconfig, sensor.get('room', '')),
-                                  cat=get_cat_name_from_cat_uuid(loxconfig, sensor.get('cat', '')),
-                                  complete_data=sensor)
-
-        hass.bus.async_listen(EVENT, new_sensor.event_handler)
-        devices.append(new_sensor)
-
-    for sensor in get_all_digital_info(loxconfig):
-        new_sensor = Loxonesensor(name=sensor['name'],
-                                  uuid=sensor['uuidAction'],
-                                  sensortyp="digital",
-                                  room=get_room_name_from_room_uuid(loxconfig, sensor.get('room', '')),
-                                  cat=get_cat_name_from_cat_uuid(loxconfig, sensor.get('cat', '')),
-                                  complete_data=sensor)
-        hass.bus.async_listen(EVENT, new_sensor.event_handler)
-        devices.append(new_sensor)
-
-    async_add_devices(devices)
+    def build_entities(loxconfig):
+        devices = {}
+        for sensor in get_all_analog_info(loxconfig):
+            devices[sensor['uuidAction']] = Loxonesensor(
+                name=sensor['name'],
+                uuid=sensor['uuidAction'],
+                sensortyp="analog",
+                room=get_room_name_from_room_uuid(loxconfig, sensor.get('room', '')),
+                cat=get_cat_name_from_cat_uuid(loxconfig, sensor.get('cat', '')),
+                complete_data=sensor)
+
+        for sensor in get_all_digital_info(loxconfig):
+            devices[sensor['uuidAction']] = Loxonesensor(
+                name=sensor['name'],
+                uuid=sensor['uuidAction'],
+                sensortyp="digital",
+                room=get_room_name_from_room_uuid(loxconfig, sensor.get('room', '')),
+                cat=get_cat_name_from_cat_uuid(loxconfig, sensor.get('cat', '')),
+                complete_data=sensor)
+        return devices
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
     return True
 
 
-class Loxonesensor(Entity):
+class Loxonesensor(LoxoneEntity, Entity):
     """Representation of a Sensor."""
 
     def __init__(self, name, uuid, sensortyp, room="", cat="",
@@ -66,56 +96,54 @@ class Loxonesensor(Entity):
         self._uuid = uuid
         self._sensortyp = sensortyp
         self._unit_of_measurement = None
-        self._format = None
+        self._formatter = None
         self._on_state = STATE_ON
         self._off_state = STATE_OFF
         self._room = room
         self._cat = cat
         self._complete_data = complete_data
         self.extract_attributes()
+        self._rendered_state = self._render(self._state)
+
+    def _render(self, value):
+        if self._formatter is not None:
+            try:
+                return self._formatter(value)
+            except (TypeError, ValueError):
+                return value
+        return value
 
-    async def event_handler(self, event):
-        if self._uuid in event.data:
+    def update_from_data(self, data):
+        if self._uuid in data:
             if self._sensortyp == "analog":
-                self._state = round(event.data[self._uuid], 1)
+                self._state = round(data[self._uuid], 1)
             elif self._sensortyp == "digital":
-                self._state = event.data[self._uuid]
+                self._state = data[self._uuid]
                 if self._state == 1.0:
                     self._state = self._on_state
                 else:
                     self._state = self._off_state
             else:
-                self._state = event.data[self._uuid]
-            self.schedule_update_ha_state()
-
-    @staticmethod
-    def _clean_unit(lox_format):
-        cleaned_fields = []
-        fields = lox_format.split(" ")
-        for f in fields:
-            _ = f.strip()
-            if len(_) > 0:
-                cleaned_fields.append(_)
-
-        if len(cleaned_fields) > 1:
-            unit = cleaned_fields[1]
-            if unit == "%%":
-                unit = "%"
-            return unit
-        return None
-
-    @staticmethod
-    def _get_format(lox_format):
-        cleaned_fields = []
-        fields = lox_format.split(" ")
-        for f in fields:
-            _ = f.strip()
-            if len(_) > 0:
-                cleaned_fields.append(_)
-
-        if len(cleaned_fields) > 1:
-            return cleaned_fields[0]
-        return None
+                self._state = data[self._uuid]
+            self._rendered_state = self._render(self._state)
+            return True
+        return False
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self._unsub_history_refresh = None
+        if self._uuid in self.miniserver_data['history']:
+            self._unsub_history_refresh = async_track_time_interval(
+                self.hass, self._async_refresh_history, HISTORY_REFRESH_INTERVAL)
+
+    async def async_will_remove_from_hass(self):
+        await super().async_will_remove_from_hass()
+        if self._unsub_history_refresh is not None:
+            self._unsub_history_refresh()
+
+    @callback
+    def _async_refresh_history(self, now):
+        self.async_schedule_update_ha_state()
 
     def extract_attributes(self):
         """Extract certain Attributes. Not all."""
@@ -127,8 +155,8 @@ class Loxonesensor(Entity):
                     self._off_state = self._complete_data['details']['text'][
                         'off']
                 if "format" in self._complete_data['details']:
-                    self._format = self._get_format(self._complete_data['details']['format'])
-                    self._unit_of_measurement = self._clean_unit(self._complete_data['details']['format'])
+                    self._formatter, self._unit_of_measurement = compile_loxone_format(
+                        self._complete_data['details']['format'])
 
     @property
     def name(self):
@@ -142,13 +170,7 @@ class Loxonesensor(Entity):
     @property
     def state(self):
         """Return the state of the sensor."""
-        if self._format is not None:
-            try:
-                return self._format % self._state
-            except ValueError:
-                return self._state
-        else:
-            return self._state
+        return self._rendered_state
 
     @property
     def unit_of_measurement(self):
@@ -166,6 +188,11 @@ class Loxonesensor(Entity):
 
         Implemented by platform classes.
         """
-        return {"uuid": self._uuid, "device_typ": self._sensortyp + "_sensor",
-                "plattform": "loxone", "room": self._room, "category": self._cat,
-                "show_last_changed": "true"}
+        attributes = {"uuid": self._uuid, "device_typ": self._sensortyp + "_sensor",
+                      "plattform": "loxone", "room": self._room, "category": self._cat,
+                      "show_last_changed": "true"}
+        if self.hass is not None:
+            statistics = self.miniserver_data['history'].statistics(self._uuid)
+            if statistics is not None:
+                attributes.update(statistics)
+        return attributes
@@ -0,0 +1,180 @@
+"""
+Shared memory export of the value states for other local processes.
+
+The values file is memory mapped: a header followed by one float64 per
+state slot (NaN if unknown).
+
+    magic "LXS1", version, capacity, count, sequence (uint64)
+
+The sequence is a seqlock: it is odd while the values are written and
+incremented to the next even number afterwards. Readers copy the values
+and retry if the sequence was odd or changed meanwhile. Count is set to
+REOPEN if the file was replaced by a bigger one.
+
+The index file next to it (<values file>.index) holds the uuid of every
+slot as JSON. Slots never change, so readers only reload it when count
+grows. Only needs NumPy, so LoxoneSharedStatesReader can be used outside
+of Home Assistant.
+"""
+import json
+import logging
+import os
+import struct
+import time
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+SHARED_MEMORY_DIRECTORY = "/dev/shm"
+MAGIC = b"LXS1"
+VERSION = 1
+# magic, version, capacity, count, sequence
+HEADER = struct.Struct("<4sIIIQ")
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = 16
+REOPEN = 0xFFFFFFFF
+MIN_CAPACITY = 1024
+
+
+def index_filename(filename):
+    return filename + ".index"
+
+
+class LoxoneSharedStates:
+    """Writer side, mirrors the value array of a LoxoneStateStore."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._map = None
+        self._count = None
+        self._sequence = None
+        self._values = None
+        self._index_count = 0
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def _create(self, capacity):
+        """Write a new values file and return its memory map."""
+        temp_filename = self._filename + ".tmp"
+        with open(temp_filename, "wb") as values_file:
+            values_file.write(HEADER.pack(MAGIC, VERSION, capacity, 0, 0).ljust(HEADER_SIZE, b"\0"))
+            values_file.write(np.full(capacity, np.nan, dtype="<f8").tobytes())
+        new_map = np.memmap(temp_filename, dtype=np.uint8, mode="r+")
+        os.replace(temp_filename, self._filename)
+        _LOGGER.debug("shared states {} with {} slots".format(self._filename, capacity))
+        return new_map
+
+    def _write_index(self, uuids):
+        temp_filename = index_filename(self._filename) + ".tmp"
+        with open(temp_filename, "w") as index_file:
+            json.dump({"uuids": uuids}, index_file)
+        os.replace(temp_filename, index_filename(self._filename))
+
+    def resize(self, uuids):
+        """Create a bigger values file if needed and write the index of uuids.
+
+        Does the file I/O, so run it in an executor and pass the result to
+        activate() on the event loop. Returns the map of the new values file,
+        or None if the current one is big enough.
+        """
+        new_map = None
+        if self._map is None or len(uuids) > len(self._values):
+            new_map = self._create(max(MIN_CAPACITY, 2 * len(uuids)))
+        self._write_index(uuids)
+        return new_map
+
+    def activate(self, new_map, index_count):
+        """Switch to the result of resize(), index_count uuids are indexed."""
+        if new_map is not None:
+            if self._map is not None:
+                # tell readers of the old file to open the new one
+                self._count[0] = REOPEN
+                del self._map
+            self._map = new_map
+            self._count = self._map[12:16].view("<u4")
+            self._sequence = self._map[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].view("<u8")
+            self._values = self._map[HEADER_SIZE:].view("<f8")
+        self._index_count = index_count
+
+    def write(self, state_store):
+        """Copy the current values of the store into the shared file.
+
+        Only copies the array, so it can run on the event loop. Slots the
+        file or the index do not cover yet are left out; returns False in
+        that case, then resize() is due.
+        """
+        if self._map is None:
+            return False
+        count = min(len(state_store), len(self._values), self._index_count)
+        self._sequence[0] += 1
+        self._values[:count] = state_store.values[:count]
+        self._count[0] = count
+        self._sequence[0] += 1
+        return count == len(state_store)
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+            self._map = None
+
+
+class LoxoneSharedStatesReader:
+    """Reader side for other processes."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._map = None
+        self._uuids = []
+        self._slots = {}
+        self._open()
+
+    def _open(self):
+        self._map = np.memmap(self._filename, dtype=np.uint8, mode="r")
+        magic, version, _, _, _ = HEADER.unpack_from(self._map[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is no Loxone shared states file".format(self._filename))
+        self._count = self._map[12:16].view("<u4")
+        self._sequence = self._map[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].view("<u8")
+        self._values = self._map[HEADER_SIZE:].view("<f8")
+
+    def _load_index(self):
+        with open(index_filename(self._filename)) as index_file:
+            self._uuids = json.load(index_file)["uuids"]
+        self._slots = {uuid: slot for slot, uuid in enumerate(self._uuids)}
+
+    def _read_consistent(self, read_values):
+        """Call read_values(count) until it ran without a concurrent write."""
+        while True:
+            if self._count[0] == REOPEN:
+                self._open()
+                continue
+            before = int(self._sequence[0])
+            if before % 2:
+                time.sleep(0)
+                continue
+            count = int(self._count[0])
+            result = read_values(count)
+            if int(self._sequence[0]) == before:
+                if count > len(self._uuids):
+                    self._load_index()
+                return min(count, len(self._uuids)), result
+
+    def read(self):
+        """Return (uuids, values) as a consistent copy of all value states."""
+        count, values = self._read_consistent(lambda count: np.array(self._values[:count]))
+        return self._uuids[:count], values[:count]
+
+    def get(self, uuid):
+        """Return the current value of one state, or None."""
+        if uuid not in self._slots:
+            self._load_index()
+        slot = self._slots.get(uuid)
+        if slot is None:
+            return None
+        count, value = self._read_consistent(
+            lambda count: float(self._values[slot]) if slot < count else np.nan)
+        return None if np.isnan(value) else value
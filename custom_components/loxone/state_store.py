@@ -0,0 +1,181 @@
+"""
+Central store for the latest value of every Miniserver state.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 256
+
+
+class LoxoneStateStore:
+    """Latest value of every state uuid.
+
+    Value states live in a float64 array indexed by a slot per uuid, text
+    states and decoded daytimer/weather states in a dict. Slots are
+    assigned once and never reused, so they can be cached by readers.
+    Unknown values are NaN in the array and returned as None by
+    get()/get_many().
+    """
+
+    def __init__(self, uuids=()):
+        self._slots = {}
+        self._uuids = []
+        self._values = np.full(INITIAL_CAPACITY, np.nan, dtype=np.float64)
+        self._texts = {}
+        # True while the values come from a saved snapshot and were not
+        # confirmed by the Miniserver yet
+        self.stale = False
+        for uuid in uuids:
+            self.slot(uuid)
+
+    def __len__(self):
+        return len(self._uuids)
+
+    def __contains__(self, uuid):
+        return uuid in self._texts or (uuid in self._slots and not np.isnan(self._values[self._slots[uuid]]))
+
+    @property
+    def uuids(self):
+        """Uuids in slot order."""
+        return self._uuids
+
+    @property
+    def values(self):
+        """Value array in slot order (read only view)."""
+        view = self._values[:len(self._uuids)]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def texts(self):
+        return self._texts
+
+    def slot(self, uuid):
+        """Return the slot of a uuid, allocating a new one if needed."""
+        slot = self._slots.get(uuid)
+        if slot is None:
+            slot = len(self._uuids)
+            if slot == len(self._values):
+                grown = np.full(2 * len(self._values), np.nan, dtype=np.float64)
+                grown[:slot] = self._values
+                self._values = grown
+            self._slots[uuid] = slot
+            self._uuids.append(uuid)
+        return slot
+
+    def slots(self, uuids):
+        """Return the slots of several uuids as an index array."""
+        return np.fromiter((self.slot(uuid) for uuid in uuids), dtype=np.intp, count=len(uuids))
+
+    def update_values(self, uuids, values):
+        """Store several value states at once."""
+        if len(uuids) == 0:
+            return
+        slots = self.slots(uuids)
+        self._values[slots] = values
+
+    def update_texts(self, texts):
+        """Store several text states at once."""
+        self._texts.update(texts)
+
+    def get(self, uuid, default=None):
+        """Return the current value of a state uuid."""
+        if uuid in self._texts:
+            return self._texts[uuid]
+        slot = self._slots.get(uuid)
+        if slot is None:
+            return default
+        value = self._values[slot]
+        if np.isnan(value):
+            return default
+        return float(value)
+
+    def get_many(self, uuids):
+        """Return a dict with the current values of the known uuids."""
+        result = {}
+        for uuid in uuids:
+            value = self.get(uuid)
+            if value is not None:
+                result[uuid] = value
+        return result
+
+    def snapshot(self):
+        """Return a copy of the current values, for changed_states()."""
+        return self._values[:len(self._uuids)].copy(), dict(self._texts)
+
+    def changed_states(self, snapshot, states):
+        """Return the entries of states whose value differs from the snapshot.
+
+        Value states are compared in one vectorized pass. A state without a
+        value in the snapshot always counts as changed.
+        """
+        old_values, old_texts = snapshot
+        value_uuids = [uuid for uuid in states if uuid not in self._texts]
+        slots = self.slots(value_uuids)
+        old = np.full(len(slots), np.nan, dtype=np.float64)
+        known = slots < len(old_values)
+        old[known] = old_values[slots[known]]
+        changed_mask = old != self._values[slots]
+
+        changed = {}
+        for index in np.flatnonzero(changed_mask).tolist():
+            uuid = value_uuids[index]
+            changed[uuid] = states[uuid]
+        for uuid, value in states.items():
+            if uuid in self._texts and old_texts.get(uuid) != value:
+                changed[uuid] = value
+        return changed
+
+    def export(self):
+        """Return a copy of the store contents for save_states()."""
+        return list(self._uuids), self._values[:len(self._uuids)].copy(), dict(self._texts)
+
+    def load(self, filename):
+        """Load states saved by save_states(). Returns True on success.
+
+        Loaded states are marked as stale. Does blocking I/O.
+        """
+        if not os.path.exists(filename):
+            return False
+        try:
+            with np.load(filename) as data:
+                uuids = data['uuids'].tolist()
+                values = data['values']
+                texts = json.loads(data['texts'].tobytes().decode("utf-8"))
+        except (OSError, ValueError, KeyError) as err:
+            _LOGGER.warning("unable to load state snapshot %s: %s", filename, err)
+            return False
+        self.update_values(uuids, values)
+        self.update_texts(texts)
+        self.stale = True
+        _LOGGER.debug("loaded %d states from %s", len(uuids) + len(texts), filename)
+        return True
+
+    def as_dict(self):
+        """Return all known states as one dict, like a loxone_event payload."""
+        known = ~np.isnan(self._values[:len(self._uuids)])
+        result = {self._uuids[slot]: value for slot, value in
+                  zip(np.flatnonzero(known).tolist(), self._values[:len(self._uuids)][known].tolist())}
+        result.update(self._texts)
+        return result
+
+
+def save_states(filename, exported):
+    """Write the result of LoxoneStateStore.export() to a file.
+
+    The file is replaced atomically. Does blocking I/O.
+    """
+    uuids, values, texts = exported
+    known = ~np.isnan(values)
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as snapshot_file:
+        np.savez_compressed(snapshot_file,
+                            uuids=np.array(uuids, dtype=str)[known],
+                            values=values[known],
+                            texts=np.frombuffer(json.dumps(texts).encode("utf-8"), dtype=np.uint8))
+    os.replace(temp_filename, filename)
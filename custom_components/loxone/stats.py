@@ -0,0 +1,113 @@
+"""
+Download, decode and cache the Miniserver's own statistics files.
+
+Controls with statistics enabled have a "statistic" entry in the structure
+file listing their outputs. The Miniserver returns the data of one month
+for the command binstatisticdata/<control uuid>/<YYYYMM> as a binary file
+with one fixed size entry per sample:
+
+    16 byte uuid, uint32 timestamp (seconds since 1.1.2009), one double
+    per output
+"""
+import datetime
+import logging
+import os
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+STATISTICS_DIRECTORY = "loxone_statistics"
+CMD_GET_STATISTIC = "binstatisticdata/{}/{}"
+# 1.1.2009 00:00, the Loxone epoch
+LOXONE_EPOCH = 1230768000
+
+
+def get_statistic_outputs(control):
+    """Return the number of statistic outputs of a control (0 if none)."""
+    return len(control.get('statistic', {}).get('outputs', []))
+
+
+def statistic_dtype(outputs):
+    return np.dtype([('uuid', 'V16'), ('timestamp', '<u4'), ('values', '<f8', (outputs,))])
+
+
+def decode_statistics(data, outputs):
+    """Decode a binary statistics file into a structured array."""
+    dtype = statistic_dtype(outputs)
+    count = len(data) // dtype.itemsize
+    if count * dtype.itemsize != len(data):
+        _LOGGER.warning("statistics: ignoring %d trailing bytes", len(data) - count * dtype.itemsize)
+    return np.frombuffer(data, dtype=dtype, count=count)
+
+
+def to_unix_time(timestamps):
+    """Convert Loxone statistic timestamps to unix timestamps."""
+    return timestamps.astype(np.int64) + LOXONE_EPOCH
+
+
+class LoxoneStatistics:
+    """Statistics of the Miniserver, cached per control and month.
+
+    The Miniserver only returns whole months, so a month is downloaded
+    again on every request and the entries newer than the cached ones are
+    appended to the cache. Once a month was downloaded after it ended, its
+    cache file is marked complete and it is not downloaded anymore.
+    """
+
+    def __init__(self, hass, lox, lox_config, path):
+        self._hass = hass
+        self._lox = lox
+        self._lox_config = lox_config
+        self._path = path
+
+    def _cache_file(self, control_uuid, month):
+        return os.path.join(self._path, "{}_{}.npy".format(control_uuid, month))
+
+    @staticmethod
+    def _complete_file(filename):
+        return filename + ".complete"
+
+    def _load(self, filename):
+        """Return (entries, complete) of a cache file, entries None if missing."""
+        if not os.path.exists(filename):
+            return None, False
+        return np.load(filename), os.path.exists(self._complete_file(filename))
+
+    def _save(self, filename, entries, complete):
+        os.makedirs(self._path, exist_ok=True)
+        np.save(filename, entries)
+        if complete:
+            open(self._complete_file(filename), "w").close()
+
+    def outputs(self, control_uuid):
+        controls = list(self._lox_config.get('controls', {}).values())
+        while controls:
+            control = controls.pop()
+            if control.get('uuidAction') == control_uuid:
+                return get_statistic_outputs(control)
+            controls.extend(control.get('subControls', {}).values())
+        return 0
+
+    async def async_get(self, control_uuid, month=None):
+        """Return the statistics of a control for a month (YYYYMM)."""
+        current_month = datetime.date.today().strftime("%Y%m")
+        month = current_month if month is None else str(month)
+        outputs = self.outputs(control_uuid)
+        if outputs == 0:
+            raise ValueError("control {} has no statistics".format(control_uuid))
+
+        filename = self._cache_file(control_uuid, month)
+        cached, complete = await self._hass.async_add_executor_job(self._load, filename)
+        if cached is not None and complete:
+            return cached
+
+        data = await self._lox.get_file(CMD_GET_STATISTIC.format(control_uuid, month))
+        entries = decode_statistics(data, outputs)
+        if cached is not None and len(cached) > 0:
+            newer = entries[entries['timestamp'] > cached['timestamp'][-1]]
+            _LOGGER.debug("statistics %s/%s: %d new entries", control_uuid, month, len(newer))
+            entries = np.concatenate([cached, newer])
+        # YYYYMM strings compare like the months
+        await self._hass.async_add_executor_job(self._save, filename, entries, month < current_month)
+        return entries
@@ -7,7 +7,9 @@ from homeassistant.components.switch import SwitchDevice
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE)
 from homeassistant.const import DEVICE_DEFAULT_NAME
-from . import get_room_name_from_room_uuid, get_cat_name_from_cat_uuid, get_all_push_buttons
+from . import get_room_name_from_room_uuid, get_cat_name_from_cat_uuid, get_all_push_buttons, \
+    LoxoneEntity, async_add_loxone_entities, get_miniserver_name
+from .dispatcher import PRIORITY_INTERACTIVE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,56 +23,53 @@ async def async_setup_platform(hass, config, async_add_devices, discovery_info={
     if value_template is not None:
         value_template.hass = hass
 
-    config = hass.data[DOMAIN]
-    loxconfig = config['loxconfig']
-
-    devices = []
-
-    for push_button in get_all_push_buttons(loxconfig):
-        if push_button['type'] in ["Pushbutton", "Switch"]:
-            new_push_button = LoxoneSwitch(push_button['name'],
-                                           push_button['uuidAction'],
-                                           push_button['states']['active'],
-                                           room=get_room_name_from_room_uuid(loxconfig, push_button.get('room', '')),
-                                           cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat', '')))
-            hass.bus.async_listen(EVENT, new_push_button.event_handler)
-            devices.append(new_push_button)
-
-        elif push_button['type'] == "TimedSwitch":
-            new_push_button = LoxoneTimedSwitch(push_button['name'],
-                                                push_button['uuidAction'],
-                                                push_button['states'],
-                                                room=get_room_name_from_room_uuid(loxconfig,
-                                                                                  push_button.get('room', '')),
-                                                cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat', '')))
-            hass.bus.async_listen(EVENT, new_push_button.event_handler)
-            devices.append(new_push_button)
-
-        elif push_button['type'] == "Intercom":
-            if "subControls" in push_button:
-
-                for sub_name in push_button['subControls']:
-                    subcontol = push_button['subControls'][sub_name]
-                    if "states" in subcontol and "active" in subcontol['states']:
-                        active = subcontol['states']['active']
-
-                    new_push_button = LoxoneIntercomSubControl("{} - {}".format(push_button['name'], subcontol['name']),
-                                                               subcontol['uuidAction'],
-                                                               active,
-                                                               room=get_room_name_from_room_uuid(loxconfig,
-                                                                                                 push_button.get('room',
-                                                                                                                 '')),
-                                                               cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat','')))
-
-                    hass.bus.async_listen(EVENT, new_push_button.event_handler)
-                    devices.append(new_push_button)
-
-    async_add_devices(devices)
+    def build_entities(loxconfig):
+        devices = {}
+
+        for push_button in get_all_push_buttons(loxconfig):
+            if push_button['type'] in ["Pushbutton", "Switch"]:
+                new_push_button = LoxoneSwitch(push_button['name'],
+                                               push_button['uuidAction'],
+                                               push_button['states']['active'],
+                                               room=get_room_name_from_room_uuid(loxconfig, push_button.get('room', '')),
+                                               cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat', '')))
+                devices[push_button['uuidAction']] = new_push_button
+
+            elif push_button['type'] == "TimedSwitch":
+                new_push_button = LoxoneTimedSwitch(push_button['name'],
+                                                    push_button['uuidAction'],
+                                                    push_button['states'],
+                                                    room=get_room_name_from_room_uuid(loxconfig,
+                                                                                      push_button.get('room', '')),
+                                                    cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat', '')))
+                devices[push_button['uuidAction']] = new_push_button
+
+            elif push_button['type'] == "Intercom":
+                if "subControls" in push_button:
+
+                    for sub_name in push_button['subControls']:
+                        subcontol = push_button['subControls'][sub_name]
+                        if "states" in subcontol and "active" in subcontol['states']:
+                            active = subcontol['states']['active']
+
+                        new_push_button = LoxoneIntercomSubControl("{} - {}".format(push_button['name'], subcontol['name']),
+                                                                   subcontol['uuidAction'],
+                                                                   active,
+                                                                   room=get_room_name_from_room_uuid(loxconfig,
+                                                                                                     push_button.get('room',
+                                                                                                                     '')),
+                                                                   cat=get_cat_name_from_cat_uuid(loxconfig, push_button.get('cat','')))
+
+                        devices[subcontol['uuidAction']] = new_push_button
+        return devices
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
     return True
 
 
-class LoxoneTimedSwitch(SwitchDevice):
+class LoxoneTimedSwitch(LoxoneEntity, SwitchDevice):
     """Representation of a loxone switch or pushbutton"""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, name, uuid, states, room="", cat=""):
         self._name = name or DEVICE_DEFAULT_NAME
@@ -111,7 +110,7 @@ class LoxoneTimedSwitch(SwitchDevice):
     @property
     def assumed_state(self):
         """Return if the state is based on assumptions."""
-        return self._assumed
+        return self._assumed or super().assumed_state
 
     @property
     def is_on(self):
@@ -132,23 +131,22 @@ class LoxoneTimedSwitch(SwitchDevice):
         self._state = False
         self.schedule_update_ha_state()
 
-    async def event_handler(self, event):
+    def update_from_data(self, data):
         should_update = False
-        if self._deactivation_delay in event.data:
-            if event.data[self._deactivation_delay] == 0.0:
+        if self._deactivation_delay in data:
+            if data[self._deactivation_delay] == 0.0:
                 self._state = False
             else:
                 self._state = True
 
-            self._delay_remain = int(event.data[self._deactivation_delay])
+            self._delay_remain = int(data[self._deactivation_delay])
             should_update = True
 
-        if self._deactivation_delay_total in event.data:
-            self._delay_time_total = int(event.data[self._deactivation_delay_total])
+        if self._deactivation_delay_total in data:
+            self._delay_time_total = int(data[self._deactivation_delay_total])
             should_update = True
 
-        if should_update:
-            self.async_schedule_update_ha_state()
+        return should_update
 
     @property
     def device_state_attributes(self):
@@ -173,8 +171,9 @@ class LoxoneTimedSwitch(SwitchDevice):
                     "plattform": "loxone"}
 
 
-class LoxoneSwitch(SwitchDevice):
+class LoxoneSwitch(LoxoneEntity, SwitchDevice):
     """Representation of a loxone switch or pushbutton"""
+    dispatch_priority = PRIORITY_INTERACTIVE
 
     def __init__(self, name, uuid, uuid_state, room="", cat=""):
         """Initialize the Demo switch."""
@@ -205,7 +204,7 @@ class LoxoneSwitch(SwitchDevice):
     @property
     def assumed_state(self):
         """Return if the state is based on assumptions."""
-        return self._assumed
+        return self._assumed or super().assumed_state
 
     @property
     def is_on(self):
@@ -228,11 +227,12 @@ class LoxoneSwitch(SwitchDevice):
             self._state = False
             self.schedule_update_ha_state()
 
-    async def event_handler(self, event):
-        if self._uuid in event.data or self._uuid_state in event.data:
-            if self._uuid_state in event.data:
-                self._state = event.data[self._uuid_state]
-            self.async_schedule_update_ha_state()
+    def update_from_data(self, data):
+        if self._uuid in data or self._uuid_state in data:
+            if self._uuid_state in data:
+                self._state = data[self._uuid_state]
+            return True
+        return False
 
     @property
     def device_state_attributes(self):
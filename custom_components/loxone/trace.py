@@ -0,0 +1,68 @@
+"""
+Protocol trace of the Miniserver connection.
+
+Decoded frames and sent commands are written as JSON lines to a rotating
+file instead of the Home Assistant log. Only every n-th frame is traced
+and the states can be limited to some uuids. Records are queued as they
+are; the JSON formatting and the file I/O happen in a listener thread, so
+the event loop only pays for the sampling decision and a queue put.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = "loxone_trace.jsonl"
+DEFAULT_TRACE_SAMPLE = 1
+DEFAULT_TRACE_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TRACE_BACKUP_COUNT = 3
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, default=str)
+
+
+class LoxoneTrace:
+    def __init__(self, filename, sample=DEFAULT_TRACE_SAMPLE, uuids=None,
+                 max_bytes=DEFAULT_TRACE_MAX_BYTES, backup_count=DEFAULT_TRACE_BACKUP_COUNT):
+        self._sample = max(1, sample)
+        self._uuids = set(uuids) if uuids else None
+        self._frames = 0
+        self._queue = queue.SimpleQueue()
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        file_handler.setFormatter(_JsonLineFormatter())
+        self._listener = logging.handlers.QueueListener(self._queue, file_handler)
+
+    def start(self):
+        self._listener.start()
+
+    def stop(self):
+        self._listener.stop()
+
+    def _put(self, record):
+        record["time"] = time.time()
+        self._queue.put_nowait(logging.makeLogRecord({"msg": record}))
+
+    def frame(self, message_type, data):
+        """Trace a decoded frame, if it is sampled and has traced uuids."""
+        self._frames += 1
+        if self._frames % self._sample:
+            return
+        if isinstance(data, dict):
+            if self._uuids is not None:
+                data = {uuid: value for uuid, value in data.items() if uuid in self._uuids}
+            if data:
+                self._put({"type": message_type, "states": data})
+        elif self._uuids is None:
+            self._put({"type": message_type, "text": data})
+
+    def command(self, command):
+        """Trace a command sent to the Miniserver."""
+        if self._uuids is not None and not any(uuid in command for uuid in self._uuids):
+            return
+        self._put({"command": command})
@@ -0,0 +1,71 @@
+"""
+Event loop lag watchdog.
+
+A ticker task sleeps for a fixed interval and measures how late it wakes
+up. Meanwhile LoxWs reports every processed frame (message type, number
+of states, processing time) and the dispatcher the time spent in every
+entity. When the lag of one interval exceeds the threshold, the frames
+and the slowest entities of that interval are logged, which shows whether
+the Loxone integration caused the lag.
+"""
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WATCHDOG_INTERVAL = 0.05
+DEFAULT_WATCHDOG_THRESHOLD = 0.1
+TOP_ENTITIES = 5
+
+
+class LoxoneWatchdog:
+    def __init__(self, threshold=DEFAULT_WATCHDOG_THRESHOLD, interval=DEFAULT_WATCHDOG_INTERVAL):
+        self._threshold = threshold
+        self._interval = interval
+        self._task = None
+        # message type -> [frames, states, seconds] of the current interval
+        self._frames = {}
+        # entity id -> seconds spent in the current interval
+        self._handlers = {}
+        self.max_lag = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def frame(self, message_type, states, duration):
+        """Record a processed frame."""
+        stats = self._frames.setdefault(message_type, [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += states
+        stats[2] += duration
+
+    def handler(self, entity_id, duration):
+        """Record the time an entity spent handling an update."""
+        self._handlers[entity_id] = self._handlers.get(entity_id, 0.0) + duration
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self._interval
+            await asyncio.sleep(self._interval)
+            lag = time.perf_counter() - expected
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self._threshold and (self._frames or self._handlers):
+                self._report(lag)
+            self._frames = {}
+            self._handlers = {}
+
+    def _report(self, lag):
+        frames = ", ".join(
+            "type {} x{} ({} states, {:.1f} ms)".format(message_type, count, states, seconds * 1000)
+            for message_type, (count, states, seconds) in sorted(self._frames.items()))
+        slowest = sorted(self._handlers.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTITIES]
+        entities = ", ".join("{} {:.1f} ms".format(entity_id, seconds * 1000) for entity_id, seconds in slowest)
+        _LOGGER.warning("event loop lag {:.0f} ms while processing Loxone frames: {}; slowest entities: {}".format(
+            lag * 1000, frames or "none", entities or "none"))
@@ -0,0 +1,149 @@
+"""
+Loxone weather component.
+"""
+import logging
+from datetime import datetime, timezone
+
+from homeassistant.components.weather import (
+    ATTR_FORECAST_CONDITION, ATTR_FORECAST_PRECIPITATION, ATTR_FORECAST_TEMP,
+    ATTR_FORECAST_TIME, ATTR_FORECAST_WIND_BEARING, ATTR_FORECAST_WIND_SPEED,
+    WeatherEntity)
+from homeassistant.const import TEMP_CELSIUS
+
+from . import LoxoneEntity, async_add_loxone_entities, get_miniserver_name
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = 'loxone'
+EVENT = "loxone_event"
+
+# Loxone weather types (meteoblue pictocodes) -> Home Assistant conditions
+WEATHER_CONDITIONS = {
+    1: "sunny", 2: "sunny", 3: "sunny",
+    4: "partlycloudy", 5: "partlycloudy", 6: "partlycloudy", 7: "partlycloudy",
+    8: "partlycloudy", 9: "lightning", 10: "partlycloudy", 11: "partlycloudy",
+    12: "lightning", 13: "partlycloudy", 14: "partlycloudy", 15: "lightning",
+    16: "fog", 17: "fog", 18: "fog",
+    19: "cloudy", 20: "cloudy", 21: "cloudy", 22: "cloudy",
+    23: "rainy", 24: "snowy", 25: "pouring", 26: "snowy",
+    27: "lightning-rainy", 28: "lightning-rainy", 29: "snowy", 30: "lightning-rainy",
+    31: "rainy", 32: "snowy", 33: "rainy", 34: "snowy", 35: "snowy-rainy",
+}
+
+
+async def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+    """Set up the Loxone weather server."""
+    if discovery_info is None:
+        return
+
+    def build_entities(loxconfig):
+        weather_server = loxconfig.get('weatherServer')
+        if weather_server is None or 'states' not in weather_server:
+            return {}
+
+        new_weather = LoxoneWeather("Loxone Weather",
+                                    actual_uuid=weather_server['states'].get('actual', ''),
+                                    forecast_uuid=weather_server['states'].get('forecast', ''),
+                                    weather_type_texts=weather_server.get('weatherTypeTexts', {}))
+        return {new_weather.unique_id: new_weather}
+
+    async_add_loxone_entities(hass, get_miniserver_name(discovery_info), async_add_devices, build_entities)
+    return True
+
+
+def to_hass_condition(weather_type):
+    return WEATHER_CONDITIONS.get(weather_type)
+
+
+class LoxoneWeather(LoxoneEntity, WeatherEntity):
+    """Current weather and forecast of the Loxone weather service."""
+
+    def __init__(self, name, actual_uuid, forecast_uuid, weather_type_texts=None):
+        self._name = name
+        self._actual_uuid = actual_uuid
+        self._forecast_uuid = forecast_uuid
+        self._weather_type_texts = weather_type_texts or {}
+        self._actual = None
+        self._forecast = []
+
+    def update_from_data(self, data):
+        request_update = False
+        if self._actual_uuid in data:
+            entries = data[self._actual_uuid]['entries']
+            self._actual = entries[0] if entries else None
+            request_update = True
+
+        if self._forecast_uuid in data:
+            self._forecast = data[self._forecast_uuid]['entries']
+            request_update = True
+
+        return request_update
+
+    def _current(self, key):
+        if self._actual is not None:
+            return self._actual[key]
+        if self._forecast:
+            return self._forecast[0][key]
+        return None
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def unique_id(self) -> str:
+        """Return a unique ID."""
+        return self._actual_uuid or self._forecast_uuid
+
+    @property
+    def condition(self):
+        return to_hass_condition(self._current('weather_type'))
+
+    @property
+    def temperature(self):
+        return self._current('temperature')
+
+    @property
+    def temperature_unit(self):
+        return TEMP_CELSIUS
+
+    @property
+    def pressure(self):
+        return self._current('barometric_pressure')
+
+    @property
+    def humidity(self):
+        return self._current('relative_humidity')
+
+    @property
+    def wind_speed(self):
+        return self._current('wind_speed')
+
+    @property
+    def wind_bearing(self):
+        return self._current('wind_direction')
+
+    @property
+    def forecast(self):
+        return [{ATTR_FORECAST_TIME: datetime.fromtimestamp(entry['timestamp'], timezone.utc).isoformat(),
+                 ATTR_FORECAST_CONDITION: to_hass_condition(entry['weather_type']),
+                 ATTR_FORECAST_TEMP: entry['temperature'],
+                 ATTR_FORECAST_PRECIPITATION: entry['precipitation'],
+                 ATTR_FORECAST_WIND_SPEED: entry['wind_speed'],
+                 ATTR_FORECAST_WIND_BEARING: entry['wind_direction']}
+                for entry in self._forecast]
+
+    @property
+    def device_state_attributes(self):
+        """Return device specific state attributes.
+
+        Implemented by platform classes.
+        """
+        weather_type = self._current('weather_type')
+        return {"uuid": self._actual_uuid, "device_typ": "weather",
+                "weather_text": self._weather_type_texts.get(str(weather_type), ""),
+                "plattform": "loxone"}
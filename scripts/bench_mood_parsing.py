@@ -0,0 +1,89 @@
+"""
+Benchmark of the mood list and colour parsers of the light platform.
+
+parse_mood_list and parse_color are taken from custom_components/loxone/light.py
+and compared with the eval based parsing they replaced, for mood lists of
+realistic sizes. Neither Home Assistant nor a Miniserver is needed.
+
+    python scripts/bench_mood_parsing.py
+"""
+import argparse
+import ast
+import json
+import logging
+import os
+import re
+import timeit
+from functools import lru_cache
+
+SOURCE = "custom_components/loxone/light.py"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARSERS = ("parse_mood_list", "_to_number", "parse_color")
+# moods of a light controller; the "off" mood is always present
+MOOD_COUNTS = (8, 32, 128)
+COLORS = ("hsv(120,80,100)", "temp(75,3200)")
+
+
+def load_parsers():
+    with open(os.path.join(ROOT, SOURCE)) as source_file:
+        tree = ast.parse(source_file.read())
+    body = [node for node in tree.body
+            if (isinstance(node, ast.FunctionDef) and node.name in PARSERS)
+            or (isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "COLOR_PATTERN" for target in node.targets))]
+    namespace = {"json": json, "re": re, "lru_cache": lru_cache, "_LOGGER": logging.getLogger(__name__)}
+    exec(compile(ast.Module(body, []), SOURCE, "exec"), namespace)
+    return namespace
+
+
+def mood_list(count):
+    """A moodList state as the Miniserver sends it."""
+    moods = [{"name": "Mood {}".format(mood), "id": mood, "static": False, "used": mood % 3}
+             for mood in range(1, count + 1)]
+    moods.append({"name": "Off", "id": 778, "static": True, "used": 0})
+    return json.dumps(moods, separators=(",", ":"))
+
+
+def eval_mood_list(raw):
+    """The parsing before, eval with Python literals for true/false."""
+    return eval(raw.replace("true", "True").replace("false", "False"))
+
+
+def eval_color(raw):
+    if raw.startswith("hsv"):
+        return eval(raw.replace("hsv", ""))
+    return eval(raw.replace("temp", ""))
+
+
+def per_call(statement, number):
+    """Return the best time of one call in microseconds."""
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per measurement")
+    args = parser.parse_args()
+    parsers = load_parsers()
+    parse_mood_list = parsers["parse_mood_list"]
+    parse_color = parsers["parse_color"]
+
+    for count in MOOD_COUNTS:
+        raw = mood_list(count)
+        assert list(parse_mood_list.__wrapped__(raw)) == eval_mood_list(raw)
+        print("mood list of {:3d} moods: eval {:8.1f} us, json {:7.1f} us, cached {:5.2f} us".format(
+            count,
+            per_call(lambda: eval_mood_list(raw), args.number),
+            per_call(lambda: parse_mood_list.__wrapped__(raw), args.number),
+            per_call(lambda: parse_mood_list(raw), args.number)))
+    for raw in COLORS:
+        print("colour {:16s}   eval {:8.1f} us, regex {:6.1f} us, cached {:5.2f} us".format(
+            raw,
+            per_call(lambda: eval_color(raw), args.number),
+            per_call(lambda: parse_color.__wrapped__(raw), args.number),
+            per_call(lambda: parse_color(raw), args.number)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark of the LoxWs listener: state frames per second.
+
+The listener methods of LoxWs are taken from custom_components/loxone/__init__.py
+(or from a git revision with --rev) and run against a fake websocket, so
+neither Home Assistant nor a Miniserver is needed, only NumPy. A producer
+queues bursts of header/payload pairs of value states, optionally while
+other tasks keep the event loop busy.
+
+    python scripts/bench_ws_listen.py
+    python scripts/bench_ws_listen.py --rev <commit before the change>
+    python scripts/bench_ws_listen.py --decode-in-thread
+"""
+import argparse
+import ast
+import asyncio
+import collections
+import logging
+import os
+import struct
+import subprocess
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+SOURCE = "custom_components/loxone/__init__.py"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LISTENER_METHODS = ("ws_listen", "_async_recv_frames", "_pair_frames", "_decode_frames",
+                    "_async_process_message", "_parse_loxone_message", "_decode_states")
+DECODERS = ("uuid_bytes_to_str", "decode_value_states", "decode_text_states", "_decode_entries",
+            "decode_daytimer_states", "decode_weather_states", "decode_state_frames")
+# value states message header, payload of 240 bytes
+HEADER = bytes([3, 2, 0, 0]) + struct.pack("<I", 240)
+STATES_PER_FRAME = 10
+
+
+def read_source(rev):
+    if rev is None:
+        with open(os.path.join(ROOT, SOURCE)) as source_file:
+            return source_file.read()
+    return subprocess.check_output(["git", "show", "{}:{}".format(rev, SOURCE)], cwd=ROOT).decode()
+
+
+def load_listener(source):
+    """Return a class with the listener methods of LoxWs and the decoders."""
+    tree = ast.parse(source)
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # the decoders only need the standard library and NumPy
+            modules = [getattr(node, "module", None) or ""] + [alias.name for alias in node.names]
+            if getattr(node, "level", 0) or any(
+                    module.startswith(("homeassistant", "voluptuous", "Crypto")) for module in modules):
+                continue
+            body.append(node)
+        elif isinstance(node, ast.Assign) and all(
+                isinstance(target, ast.Name) and target.id.isupper() for target in node.targets):
+            if "cv." not in ast.unparse(node) and "vol." not in ast.unparse(node):
+                body.append(node)
+        elif isinstance(node, ast.FunctionDef) and node.name in DECODERS:
+            body.append(node)
+        elif isinstance(node, ast.ClassDef) and node.name == "LoxWs":
+            node.body = [method for method in node.body
+                         if isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef))
+                         and method.name in LISTENER_METHODS]
+            node.bases = []
+            node.decorator_list = []
+            body.append(node)
+    namespace = {"_LOGGER": logging.getLogger(__name__), "LxJsonKeySalt": object}
+    exec(compile(ast.fix_missing_locations(ast.Module(body, [])), SOURCE, "exec"), namespace)
+    return namespace["LoxWs"]
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+def provide_websockets_exceptions():
+    """ws_listen imports ConnectionClosed; the fake websocket needs no library."""
+    try:
+        import websockets.exceptions  # noqa: F401
+    except ImportError:
+        sys.modules["websockets"] = types.ModuleType("websockets")
+        sys.modules["websockets.exceptions"] = types.ModuleType("websockets.exceptions")
+        sys.modules["websockets.exceptions"].ConnectionClosed = ConnectionClosed
+
+
+class FakeWebsocket:
+    """Queue of received messages like the websockets protocol keeps it."""
+
+    def __init__(self):
+        self.messages = collections.deque()
+        self._waiter = None
+
+    def put(self, frames):
+        self.messages.extend(frames)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def recv(self):
+        while not self.messages:
+            self._waiter = asyncio.get_event_loop().create_future()
+            await self._waiter
+        return self.messages.popleft()
+
+
+def new_listener(listener_class, decode_executor):
+    lox = listener_class()
+    lox._ws = FakeWebsocket()
+    lox._current_message_typ = None
+    lox._decode_executor = decode_executor
+    lox._file_requests = collections.deque()
+    lox._drain_unsupported = False
+    lox.state_store = lox.archive = lox.trace = lox.watchdog = None
+    return lox
+
+
+async def run(listener_class, frames, burst, busy_tasks, decode_executor=None):
+    """Return (frames per second, number of message_call_back calls)."""
+    lox = new_listener(listener_class, decode_executor)
+    calls = [0]
+
+    async def message_call_back(states, frame_states=None):
+        calls[0] += 1
+
+    lox.message_call_back = message_call_back
+    payloads = [b"".join(os.urandom(16) + os.urandom(8) for _ in range(STATES_PER_FRAME))
+                for _ in range(64)]
+    running = True
+
+    async def busy():
+        while running:
+            await asyncio.sleep(0)
+
+    others = [asyncio.ensure_future(busy()) for _ in range(busy_tasks)]
+    listener = asyncio.ensure_future(lox.ws_listen())
+    started = time.perf_counter()
+    sent = 0
+    while sent < frames:
+        queued = []
+        for frame in range(sent, sent + burst):
+            queued += [HEADER, payloads[frame % len(payloads)]]
+        lox._ws.put(queued)
+        sent += burst
+        await asyncio.sleep(0)
+    while lox._ws.messages:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    running = False
+    listener.cancel()
+    await asyncio.gather(*others)
+    return sent / elapsed, calls[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rev", help="git revision to take the listener from")
+    parser.add_argument("--frames", type=int, default=40000)
+    parser.add_argument("--decode-in-thread", action="store_true", help="decode in a worker thread")
+    args = parser.parse_args()
+    provide_websockets_exceptions()
+    listener_class = load_listener(read_source(args.rev))
+    decode_executor = ThreadPoolExecutor(max_workers=1) if args.decode_in_thread else None
+    for busy_tasks in (0, 20):
+        for burst in (1, 8, 32):
+            rate, calls = asyncio.run(run(listener_class, args.frames, burst, busy_tasks, decode_executor))
+            print("burst {:2d}, {:2d} busy tasks: {:7.0f} frames/s, {:6d} callbacks".format(
+                burst, busy_tasks, rate, calls))
+
+
+if __name__ == "__main__":
+    main()